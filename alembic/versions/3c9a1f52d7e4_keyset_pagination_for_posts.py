@@ -0,0 +1,37 @@
+"""Keyset pagination for posts
+
+Revision ID: 3c9a1f52d7e4
+Revises: ff0ea1377c05
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1f52d7e4'
+down_revision: Union[str, Sequence[str], None] = 'ff0ea1377c05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE posts SET created_at = TIMEZONE('utc', CURRENT_TIMESTAMP) WHERE created_at IS NULL")
+    op.alter_column('posts', 'created_at',
+               existing_type=sa.DateTime(),
+               server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"),
+               nullable=False)
+    op.create_index('ix_posts_created_at_id', 'posts', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_created_at_id', table_name='posts')
+    op.alter_column('posts', 'created_at',
+               existing_type=sa.DateTime(),
+               server_default=None,
+               nullable=True)
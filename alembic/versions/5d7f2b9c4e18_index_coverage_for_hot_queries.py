@@ -0,0 +1,43 @@
+"""Index coverage for hot queries
+
+Revision ID: 5d7f2b9c4e18
+Revises: 8e41b0c6a2f9
+Create Date: 2026-10-18 18:21:09.734102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7f2b9c4e18'
+down_revision: Union[str, Sequence[str], None] = '8e41b0c6a2f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицы, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_owner_id_created_at_id', 'posts',
+                        ['owner_id', sa.text('created_at DESC'), sa.text('id DESC')],
+                        unique=False, postgresql_concurrently=True)
+
+        # Уникальный индекс строится рядом со старым и подменяет его, чтобы поиск по нику не оставался без индекса.
+        # Упадет, если в таблице уже есть повторяющиеся ники: их нужно разобрать вручную до миграции.
+        op.create_index('ix_users_username_unique', 'users', ['username'], unique=True, postgresql_concurrently=True)
+        op.drop_index('ix_users_username', table_name='users', postgresql_concurrently=True)
+        op.execute('ALTER INDEX ix_users_username_unique RENAME TO ix_users_username')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_username_plain', 'users', ['username'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_users_username', table_name='users', postgresql_concurrently=True)
+        op.execute('ALTER INDEX ix_users_username_plain RENAME TO ix_users_username')
+
+        op.drop_index('ix_posts_owner_id_created_at_id', table_name='posts', postgresql_concurrently=True)
@@ -0,0 +1,43 @@
+"""Follow graph
+
+Revision ID: a1c4e7f3b2d6
+Revises: 5d7f2b9c4e18
+Create Date: 2026-10-18 21:47:55.610337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c4e7f3b2d6'
+down_revision: Union[str, Sequence[str], None] = '5d7f2b9c4e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('follows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('follower_id', sa.Integer(), nullable=False),
+    sa.Column('followee_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"), nullable=False),
+    sa.ForeignKeyConstraint(['follower_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['followee_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('follower_id', 'followee_id', name='_follower_followee_uc')
+    )
+    op.create_index(op.f('ix_follows_id'), 'follows', ['id'], unique=False)
+    op.create_index('ix_follows_followee_id', 'follows', ['followee_id'], unique=False)
+    op.add_column('users', sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'followers_count')
+    op.drop_index('ix_follows_followee_id', table_name='follows')
+    op.drop_index(op.f('ix_follows_id'), table_name='follows')
+    op.drop_table('follows')
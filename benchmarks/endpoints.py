@@ -0,0 +1,294 @@
+"""Нагрузочный прогон эндпоинтов: настоящее приложение в процессе через httpx.ASGITransport,
+SQLite во временном файле и fakeredis (или локальный Redis через --redis-url).
+
+Запуск:
+    python -m benchmarks.endpoints --output results.json
+    python -m benchmarks.endpoints --baseline baseline.json --threshold 0.2
+
+С --baseline код возврата 1, если p95 вырос или пропускная способность упала больше чем на threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+PASSWORD = 'benchmark-password'
+
+
+def configure_environment(args, db_path: str):
+    # Настройки читаются при импорте src.backend, поэтому окружение задается до него
+    os.environ.update({
+        'DB_DRIVER': 'sqlite+aiosqlite',
+        'DB_NAME': db_path,
+        'DB_USER': '', 'DB_PASSWORD': '', 'DB_HOST': '', 'DB_PORT': '0',
+        'BCRYPT_ROUNDS': str(args.bcrypt_rounds),
+    })
+
+    for name, value in {
+        'REDIS_HOST': 'localhost', 'REDIS_PORT': '6379', 'REDIS_DB': '0',
+        'ALGORITHM': 'HS256', 'SECRET_KEY': 'benchmark', 'TOKEN_ACCESS_EXPIRE_MINUTES': '30', 'BOT_TOKEN': 'benchmark',
+    }.items():
+        os.environ.setdefault(name, value)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], wall_seconds: float, errors: int) -> dict:
+
+    latencies = sorted(latencies)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / wall_seconds, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+
+    regressions = []
+
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+
+        if previous is None:
+            continue
+
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+
+        if current['rps'] < previous['rps'] * (1 - threshold):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: ошибок {previous['errors']} -> {current['errors']}")
+
+    return regressions
+
+
+async def seed(args) -> dict:
+
+    from sqlalchemy import insert, select
+    from src.backend import models
+    from src.backend.database import AsyncSessionLocal, Base, engine
+    from src.backend.security import hash_password
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(args.seed)
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(models.User.__table__), [
+            {'username': 'bench', 'password_hash': hash_password(PASSWORD)},
+            *({'username': f'user{i}', 'password_hash': 'x'} for i in range(args.users - 1)),
+        ])
+
+        user_ids = list(await session.scalars(select(models.User.id)))
+
+        # Каждый 20-й пост принадлежит bench, чтобы /user/posts не был пустым
+        await session.execute(insert(models.Post.__table__), [
+            {'title': f'Пост {i}', 'content': f'Текст поста {i} ' * 10, 'owner_id': user_ids[0] if i % 20 == 0 else rng.choice(user_ids)}
+            for i in range(args.posts)
+        ])
+        await session.commit()
+
+        return {
+            'user_id': user_ids[0],
+            'post_ids': list(await session.scalars(select(models.Post.id))),
+        }
+
+
+def scenarios(args, dataset: dict, rng: random.Random) -> dict:
+
+    own_posts = []
+
+    async def feed(client, i):
+        return await client.get('/posts')
+
+    async def feed_cursor(client, i):
+        first = await client.get('/posts', params={'limit': 20})
+
+        # На маленьком наборе второй страницы может не быть
+        if 'X-Next-Cursor' not in first.headers:
+            return first
+
+        return await client.get('/posts', params={'limit': 20, 'cursor': first.headers['X-Next-Cursor']})
+
+    async def user_posts(client, i):
+        return await client.get('/user/posts')
+
+    async def trending(client, i):
+        return await client.get('/posts/trending')
+
+    async def login(client, i):
+        return await client.post('/token', data={'username': 'bench', 'password': PASSWORD})
+
+    async def like(client, i):
+        return await client.post(f'/post/{rng.choice(dataset["post_ids"])}/like')
+
+    async def create(client, i):
+        response = await client.post('/posts', json={'title': f'Новый {i}', 'content': 'Текст'})
+        own_posts.append(response.json()['id'])
+        return response
+
+    async def update(client, i):
+        return await client.put(f'/post/{own_posts[i % len(own_posts)]}', json={'title': f'Правка {i}', 'content': 'Текст'})
+
+    async def remove(client, i):
+        return await client.delete(f'/post/{own_posts.pop()}')
+
+    async def bulk(client, i):
+        return await client.post('/posts/bulk', json=[{'title': f'Импорт {i}-{j}', 'content': 'Текст'} for j in range(100)])
+
+    # Порядок важен: update и delete работают с постами, созданными в create
+    return {
+        'GET /posts': (feed, args.requests),
+        'GET /posts?cursor': (feed_cursor, args.requests),
+        'GET /user/posts': (user_posts, args.requests),
+        'POST /token': (login, args.token_requests),
+        'POST /post/{id}/like': (like, args.requests),
+        'GET /posts/trending': (trending, args.requests),
+        'POST /posts': (create, args.requests),
+        'PUT /post/{id}': (update, args.requests),
+        'DELETE /post/{id}': (remove, args.requests // 2),
+        'POST /posts/bulk': (bulk, max(1, args.requests // 10)),
+    }
+
+
+async def run_scenario(client, call, count: int, concurrency: int) -> dict:
+
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+
+        nonlocal errors
+
+        async with semaphore:
+            started = time.perf_counter()
+            response = await call(client, i)
+            latencies.append(time.perf_counter() - started)
+
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run(args) -> dict:
+
+    import httpx
+    from src.backend import clients
+    from src.backend.main import app
+
+    # Лог каждого запроса httpx искажает замеры
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    if args.redis_url:
+        import redis.asyncio as redis
+
+        clients.redis_client = redis.from_url(args.redis_url)
+    else:
+        import fakeredis
+
+        clients.redis_client = fakeredis.FakeAsyncRedis()
+
+    await clients.redis_client.flushdb()
+
+    dataset = await seed(args)
+    rng = random.Random(args.seed)
+
+    results = {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench') as client:
+        token = (await client.post('/token', data={'username': 'bench', 'password': PASSWORD})).json()['access_token']
+
+        client.headers['Authorization'] = f'Bearer {token}'
+
+        for name, (call, count) in scenarios(args, dataset, rng).items():
+            # Прогрев: первые запросы заполняют кэши и пул соединений
+            await run_scenario(client, call, min(count, args.warmup), args.concurrency)
+
+            results[name] = await run_scenario(client, call, count, args.concurrency)
+
+            print(f"{name:<24} {results[name]['rps']:>9} req/s  p50 {results[name]['p50_ms']:>8} ms  "
+                  f"p95 {results[name]['p95_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms  errors {results[name]['errors']}")
+
+    await clients.redis_client.aclose()
+
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'users': args.users,
+            'posts': args.posts,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'bcrypt_rounds': args.bcrypt_rounds,
+        },
+        'scenarios': results,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--token-requests', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--redis-url', default=None, help='вместо fakeredis')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(args, os.path.join(tmp, 'bench.db'))
+
+        results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        for regression in regressions:
+            print(f'РЕГРЕССИЯ {regression}')
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Наполнение БД данными масштаба продакшена для нагрузочных прогонов.
+
+Пишет напрямую через database.engine (настройки DB_* из окружения): COPY на PostgreSQL,
+пачки через executemany на SQLite. Активность авторов и популярность постов
+распределены по Zipf. Данные детерминированы при одинаковом --seed
+(кроме солей bcrypt в хэшах паролей).
+
+Запуск:
+    python -m benchmarks.seed --users 200000 --posts 1000000 --likes 5000000
+    python -m benchmarks.seed --create-schema --users 1000 --posts 10000 --likes 50000
+
+Войти можно как user{N} с паролем password{N % --passwords}.
+Кэш в Redis не сбрасывается: наполнять стоит чистую базу.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from src.backend import models
+from src.backend.database import Base, engine
+from src.backend.security import hash_password
+
+SQLITE_DATETIME = '%Y-%m-%d %H:%M:%S.%f'
+
+WORDS = (
+    'город', 'погода', 'новости', 'кофе', 'рецепт', 'работа', 'отпуск', 'книга', 'фильм', 'музыка',
+    'спорт', 'утро', 'вечер', 'проект', 'код', 'релиз', 'дом', 'сад', 'кот', 'поезд',
+    'море', 'горы', 'дождь', 'солнце', 'встреча', 'идея', 'план', 'выходные', 'друзья', 'семья',
+)
+
+
+def zipf_cum_weights(n: int, s: float) -> list[float]:
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+def ranked(ids: range, rng: random.Random) -> list[int]:
+    # Ранг по Zipf не должен совпадать с порядком id, иначе самые активные всегда самые старые
+    shuffled = list(ids)
+    rng.shuffle(shuffled)
+    return shuffled
+
+
+def batches(rows, size: int):
+
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+async def write_rows(table, columns: list[str], rows, batch_size: int) -> int:
+
+    written = 0
+
+    for batch in batches(rows, batch_size):
+        async with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                raw_connection = await conn.get_raw_connection()
+
+                await raw_connection.driver_connection.copy_records_to_table(table.name, records=batch, columns=columns)
+            else:
+                # Готовый текст запроса и executemany драйвера: компиляция многострочного VALUES в SQLAlchemy
+                # на таких объемах обходится дороже самой вставки
+                placeholders = ', '.join('?' for _ in columns)
+
+                # Даты в том же текстовом формате, что пишет SQLAlchemy, иначе сломается сравнение в курсорах
+                rows = [tuple(value.strftime(SQLITE_DATETIME) if isinstance(value, datetime) else value for value in row) for row in batch]
+
+                await conn.exec_driver_sql(f'INSERT INTO {table.name} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+
+        written += len(batch)
+
+        print(f'  {table.name}: {written}', end='\r', flush=True)
+
+    print()
+
+    return written
+
+
+async def reset_sequences(*tables):
+
+    async with engine.begin() as conn:
+        if conn.dialect.name != 'postgresql':
+            return
+
+        # Явные id из COPY не двигают последовательности
+        for table in tables:
+            await conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT MAX(id) FROM {table.name}))"))
+
+
+async def next_id(table) -> int:
+    async with engine.connect() as conn:
+        return (await conn.scalar(select(func.coalesce(func.max(table.c.id), 0)))) + 1
+
+
+def like_counts(post_ids: range, total: int, max_per_post: int, s: float, rng: random.Random) -> dict[int, int]:
+
+    weights = [1 / rank ** s for rank in range(1, len(post_ids) + 1)]
+    scale = total / sum(weights)
+
+    return {post_id: min(max_per_post, int(weight * scale + rng.random())) for post_id, weight in zip(ranked(post_ids, rng), weights)}
+
+
+async def seed(args):
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+
+    if args.create_schema:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    users, posts, likes = models.User.__table__, models.Post.__table__, models.Like.__table__
+
+    first_user, first_post, first_like = await next_id(users), await next_id(posts), await next_id(likes)
+
+    print(f'Хэширую {args.passwords} паролей')
+    password_pool = [hash_password(f'password{i}') for i in range(args.passwords)]
+
+    user_ids = range(first_user, first_user + args.users)
+
+    await write_rows(users, ['id', 'username', 'password_hash'], (
+        (user_id, f'user{user_id}', password_pool[user_id % args.passwords]) for user_id in user_ids
+    ), args.batch_size)
+
+    post_ids = range(first_post, first_post + args.posts)
+
+    # Счетчики считаются заранее, чтобы likes_count сразу совпадал с таблицей likes
+    counts = like_counts(post_ids, args.likes, args.users, args.zipf_s, rng)
+
+    authors = ranked(user_ids, rng)
+    author_weights = zipf_cum_weights(len(authors), args.zipf_s)
+    epoch = datetime.fromisoformat(args.until) - timedelta(days=args.days)
+    step = timedelta(days=args.days) / max(args.posts, 1)
+
+    def post_rows():
+        for post_id, owner_id in zip(post_ids, rng.choices(authors, cum_weights=author_weights, k=args.posts)):
+            yield (
+                post_id,
+                ' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                ' '.join(rng.choices(WORDS, k=rng.randint(10, 60))),
+                epoch + step * (post_id - first_post),
+                counts[post_id],
+                owner_id,
+            )
+
+    await write_rows(posts, ['id', 'title', 'content', 'created_at', 'likes_count', 'owner_id'], post_rows(), args.batch_size)
+
+    def like_rows():
+        like_id = first_like
+
+        for post_id in post_ids:
+            # sample без повторов: пара (post_id, user_id) уникальна без глобального множества в памяти
+            for index in rng.sample(range(args.users), counts[post_id]):
+                yield like_id, post_id, user_ids[index]
+
+                like_id += 1
+
+    written_likes = await write_rows(likes, ['id', 'post_id', 'user_id'], like_rows(), args.batch_size)
+
+    await reset_sequences(users, posts, likes)
+
+    print(f'Готово: {args.users} пользователей, {args.posts} постов, {written_likes} лайков за {time.perf_counter() - started:.1f} с')
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--likes', type=int, default=5_000_000)
+    parser.add_argument('--zipf-s', type=float, default=1.1)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--until', default='2026-01-01', help='дата самого нового поста; фиксирована ради воспроизводимости')
+    parser.add_argument('--passwords', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--create-schema', action='store_true', help='создать таблицы (для SQLite; на PostgreSQL схему ведет alembic)')
+    args = parser.parse_args()
+
+    asyncio.run(seed(args))
+
+
+if __name__ == '__main__':
+    main()
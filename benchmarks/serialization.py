@@ -0,0 +1,77 @@
+"""Сравнение стоимости сериализации страницы /posts из 100 постов.
+
+Запуск: python -m benchmarks.serialization [--posts 100] [--repeat 2000]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from fastapi.responses import ORJSONResponse
+from src.backend import models, schemas
+from src.backend.serialization import dumps_post_rows, posts_adapter
+
+
+def make_posts(count: int) -> list[models.Post]:
+
+    owners = [models.User(id=i, username=f'user_{i}') for i in range(10)]
+    started = datetime(2026, 1, 1)
+
+    return [
+        models.Post(
+            id=i,
+            title=f'Пост номер {i}',
+            content='Текст поста ' * 20,
+            created_at=started + timedelta(seconds=i),
+            likes_count=i % 50,
+            owner=owners[i % len(owners)]
+        )
+        for i in range(count)
+    ]
+
+
+def fastapi_default(posts) -> bytes:
+    # Что делает FastAPI для response_model=list[schemas.Post] и JSONResponse
+    content = posts_adapter.dump_python(posts_adapter.validate_python(posts, from_attributes=True), mode='json')
+
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode()
+
+
+def fastapi_orjson(posts) -> bytes:
+    content = posts_adapter.dump_python(posts_adapter.validate_python(posts, from_attributes=True), mode='json')
+
+    return ORJSONResponse(content).body
+
+
+def model_validate_per_row(posts) -> bytes:
+    # Прежняя запись в кэш: model_validate по строке и json.dumps
+    return json.dumps([schemas.Post.model_validate(post).model_dump(mode='json') for post in posts]).encode()
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts)
+
+    candidates = {
+        'fastapi response_model + JSONResponse': fastapi_default,
+        'fastapi response_model + ORJSONResponse': fastapi_orjson,
+        'model_validate + json.dumps (old cache fill)': model_validate_per_row,
+        'dumps_post_rows (one pass)': dumps_post_rows,
+    }
+
+    baseline = None
+
+    for name, func in candidates.items():
+        seconds = min(timeit.repeat(lambda: func(posts), number=args.repeat, repeat=5)) / args.repeat
+
+        baseline = baseline or seconds
+
+        print(f'{name:<48} {seconds * 1e6:9.1f} us/request  x{baseline / seconds:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import hashlib
+import logging
+import math
+import random
+import secrets
+import time
+import redis.asyncio as redis
+from typing import Awaitable, Callable
+from . import schemas
+from .serialization import PAYLOAD_FORMAT
+from .config import get_settings
+from .local_cache import LocalCache
+from .metrics import CACHE_REQUESTS, CACHE_EVICTIONS, CACHE_COALESCED, CACHE_EARLY_REFRESHES
+
+settings = get_settings()
+
+NAMESPACE = settings.cache_namespace
+
+# Меняется вместе с формой schemas.Post и форматом payload: во время выкладки старые и новые поды
+# делят Redis и не должны читать записи друг друга
+SCHEMA_VERSION = hashlib.sha1(
+    json.dumps([schemas.Post.model_json_schema(), PAYLOAD_FORMAT], sort_keys=True).encode()
+).hexdigest()[:8]
+
+
+INVALIDATION_CHANNEL = f'{NAMESPACE}:invalidate'
+
+local_posts_cache = LocalCache(
+    'posts',
+    max_entries=settings.local_cache_max_entries,
+    max_bytes=settings.local_cache_max_bytes,
+    ttl=settings.local_cache_ttl_seconds
+)
+
+local_users_cache = LocalCache(
+    'users',
+    max_entries=settings.user_cache_max_entries,
+    max_bytes=settings.user_cache_max_entries * 256,
+    ttl=settings.user_cache_ttl_seconds
+)
+
+local_caches: dict[str, LocalCache] = {
+    local_posts_cache.name: local_posts_cache,
+    local_users_cache.name: local_users_cache,
+}
+
+
+def make_key(*parts) -> str:
+    return ':'.join([NAMESPACE, f'v{SCHEMA_VERSION}', *map(str, parts)])
+
+
+# Счетчики поколений не версионируются, чтобы во время раскатки
+# инвалидации со старых подов были видны новым и наоборот
+def feed_generation_key() -> str:
+    return f'{NAMESPACE}:gen:feed'
+
+
+def user_posts_generation_key(user_id: int) -> str:
+    return f'{NAMESPACE}:gen:user_posts:{user_id}'
+
+
+def feed_page_key(generation: int, limit: int, step: int) -> str:
+    return make_key('feed', f'g{generation}', limit, step)
+
+
+def user_posts_key(user_id: int, generation: int) -> str:
+    return make_key('user_posts', user_id, f'g{generation}')
+
+
+async def get_generation(redis_client: redis.Redis, key: str) -> int:
+
+    generation = await redis_client.get(key)
+
+    if generation is None:
+        # Стартуем не с нуля: если ключ поколения вытеснят или Redis перезапустится,
+        # старые записи не должны снова стать достижимыми
+        await redis_client.set(key, int(time.time() * 1000), nx=True)
+
+        generation = await redis_client.get(key)
+
+    return int(generation)
+
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+EXTEND_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def _should_refresh_early(meta) -> bool:
+
+    if not meta or settings.cache_early_refresh_beta <= 0:
+        return False
+
+    if isinstance(meta, bytes):
+        meta = meta.decode()
+
+    expires_at_ms, delta_ms = map(int, meta.split(':'))
+
+    # XFetch: чем ближе истечение и чем дороже пересчет, тем выше шанс обновить заранее
+    gap_ms = -delta_ms * settings.cache_early_refresh_beta * math.log(1.0 - random.random())
+
+    return time.time() * 1000 + gap_ms >= expires_at_ms
+
+
+async def _store(redis_client: redis.Redis, key: str, payload, ttl: int, delta_ms: int):
+
+    await redis_client.set(key, payload, ex=ttl)
+
+    if settings.cache_early_refresh_beta > 0:
+        expires_at_ms = int(time.time() * 1000) + ttl * 1000
+
+        await redis_client.set(f'{key}:meta', f'{expires_at_ms}:{delta_ms}', ex=ttl)
+
+
+async def _load(redis_client: redis.Redis, key: str, compute: Callable[[], Awaitable], ttl: int, cache_name: str, stale=None):
+
+    lock_key = f'{key}:lock'
+    token = secrets.token_hex(8)
+    lease_ms = settings.cache_lock_lease_ms
+
+    if await redis_client.set(lock_key, token, nx=True, px=lease_ms):
+        try:
+            started = time.perf_counter()
+
+            payload = await compute()
+
+            await _store(redis_client, key, payload, ttl, int((time.perf_counter() - started) * 1000))
+
+            return payload
+        finally:
+            await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    # Значение уже пересчитывает другая реплика
+    if stale is not None:
+        return stale
+
+    CACHE_COALESCED.labels(cache=cache_name, scope='remote').inc()
+
+    deadline = time.monotonic() + lease_ms / 1000
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.cache_lock_poll_ms / 1000)
+
+        cached = await redis_client.get(key)
+
+        if cached:
+            return cached
+
+    return await compute()
+
+
+async def get_or_compute(redis_client: redis.Redis, key: str, compute: Callable[[], Awaitable], ttl: int, cache_name: str):
+
+    if settings.cache_early_refresh_beta > 0:
+        cached, meta = await redis_client.mget(key, f'{key}:meta')
+    else:
+        cached, meta = await redis_client.get(key), None
+
+    CACHE_REQUESTS.labels(cache=cache_name, tier='redis', result='hit' if cached else 'miss').inc()
+
+    refresh_early = bool(cached) and _should_refresh_early(meta)
+
+    if cached and not refresh_early:
+        return cached
+
+    task = _inflight.get(key)
+
+    if task:
+        CACHE_COALESCED.labels(cache=cache_name, scope='local').inc()
+
+        if refresh_early:
+            return cached
+    else:
+        if refresh_early:
+            CACHE_EARLY_REFRESHES.labels(cache=cache_name).inc()
+
+        task = asyncio.ensure_future(_load(redis_client, key, compute, ttl, cache_name, stale=cached or None))
+
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    # shield: отмена одного запроса не должна отменять загрузку для остальных
+    return await asyncio.shield(task)
+
+
+async def current_generation(redis_client: redis.Redis, generation_key: str, local_key: str) -> int:
+
+    # Поколение держится в локальном уровне: по нему строится ETag, и 304 обходится без Redis
+    generation = local_posts_cache.get(local_key)
+
+    if generation is not None:
+        return generation
+
+    version = local_posts_cache.version
+
+    generation = await get_generation(redis_client, generation_key)
+
+    if local_posts_cache.version == version:
+        local_posts_cache.set(local_key, generation, size=8)
+
+    return generation
+
+
+async def get_two_tier(redis_client: redis.Redis, local_key: str, key: str, compute: Callable[[], Awaitable], ttl: int, cache_name: str, parse: Callable):
+
+    value = local_posts_cache.get(local_key)
+
+    CACHE_REQUESTS.labels(cache=cache_name, tier='local', result='miss' if value is None else 'hit').inc()
+
+    if value is not None:
+        return value
+
+    version = local_posts_cache.version
+
+    payload = await get_or_compute(redis_client, key, compute, ttl, cache_name)
+
+    value = parse(payload)
+
+    if local_posts_cache.version == version:
+        local_posts_cache.set(local_key, value, size=len(payload))
+
+    return value
+
+
+def evict_local(message: str):
+
+    cache_name, _, pattern = message.partition('|')
+
+    local = local_caches.get(cache_name)
+
+    if local is None:
+        return
+
+    if pattern.endswith('*'):
+        local.delete_prefix(pattern[:-1])
+    else:
+        local.delete(pattern)
+
+
+async def listen_invalidations(redis_client: redis.Redis):
+
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                # Пока подписки не было, инвалидации могли потеряться
+                for local in local_caches.values():
+                    local.clear()
+
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+
+                    data = message['data']
+
+                    evict_local(data.decode() if isinstance(data, bytes) else data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('Подписка на инвалидации кэша оборвалась, переподключаюсь')
+
+            await asyncio.sleep(1)
+
+
+async def invalidate_posts(redis_client: redis.Redis, *owner_ids: int):
+
+    owner_ids = set(owner_ids)
+
+    messages = ['posts|feed:*', *(f'posts|user_posts:{owner_id}:*' for owner_id in owner_ids)]
+
+    for message in messages:
+        evict_local(message)
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.incr(feed_generation_key())
+
+        for owner_id in owner_ids:
+            pipe.incr(user_posts_generation_key(owner_id))
+
+        for message in messages:
+            pipe.publish(INVALIDATION_CHANNEL, message)
+
+        await pipe.execute()
+
+    CACHE_EVICTIONS.labels(tier='redis', cache='feed', reason='invalidated').inc()
+    CACHE_EVICTIONS.labels(tier='redis', cache='user_posts', reason='invalidated').inc(len(owner_ids))
+
+
+async def invalidate_user(redis_client: redis.Redis, user_id: int):
+
+    message = f'users|{user_id}'
+
+    evict_local(message)
+
+    await redis_client.publish(INVALIDATION_CHANNEL, message)
@@ -0,0 +1,29 @@
+from fastapi import Response, status
+from .cache import SCHEMA_VERSION
+
+
+FEED_CACHE_CONTROL = 'public, no-cache'
+USER_POSTS_CACHE_CONTROL = 'private, no-cache'
+SEARCH_CACHE_CONTROL = 'public, max-age=10'
+TRENDING_CACHE_CONTROL = 'public, max-age=10'
+
+
+def make_etag(*parts) -> str:
+    # Тело не хэшируется: ETag собирается из версии схемы и поколения ленты, которое меняет любая запись
+    return '"' + '-'.join(str(part) for part in (SCHEMA_VERSION, *parts)) + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == '*':
+        return True
+
+    # Для If-None-Match сравнение слабое: префикс W/ не учитывается
+    return any(candidate.strip().removeprefix('W/') == etag for candidate in if_none_match.split(','))
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -20,6 +20,60 @@ class Settings(BaseSettings):
     token_access_expire_minutes: int
     bot_token: str
 
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    # URL реплик только для чтения (JSON-список в переменной окружения); пустой список: все идет в primary
+    db_replica_urls: list[str] = []
+    db_replica_retry_seconds: float = 30.0
+    read_your_writes_ms: int = 5000
+    query_repeat_warning_threshold: int = 5
+
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_backlog: int = 32
+
+    cache_namespace: str = 'blog'
+    user_posts_cache_ttl_seconds: int = 600
+    feed_cache_ttl_seconds: int = 30
+    feed_cache_max_depth: int = 300
+    cache_lock_lease_ms: int = 3000
+    cache_lock_poll_ms: int = 50
+    cache_early_refresh_beta: float = 0.0
+    local_cache_max_entries: int = 1000
+    local_cache_max_bytes: int = 16 * 1024 * 1024
+    local_cache_ttl_seconds: float = 5.0
+
+    user_cache_max_entries: int = 10000
+    user_cache_ttl_seconds: float = 300.0
+
+    likes_write_behind: bool = False
+    likes_flush_interval_ms: int = 500
+    likes_flush_lock_lease_ms: int = 10000
+
+    export_batch_size: int = 1000
+    export_gzip_level: int = 6
+
+    bulk_import_chunk_size: int = 1000
+
+    timeline_max_length: int = 800
+    timeline_ttl_seconds: int = 7 * 24 * 3600
+    timeline_fanout_max_followers: int = 10000
+    timeline_fanout_batch_size: int = 1000
+
+    trending_half_life_seconds: int = 6 * 3600
+    trending_max_size: int = 10000
+    trending_trim_interval_seconds: float = 60.0
+    trending_rebuild_window_seconds: int = 7 * 24 * 3600
+    trending_rebuild_batch_size: int = 5000
+
+    counts_reconcile_interval_seconds: float = 300.0
+    counts_reconcile_batch_size: int = 1000
+
     @computed_field
     @property
     def sqlalchemy_database_url(self) -> str:
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import secrets
+import redis.asyncio as redis
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, cache, database, replicas
+from .config import get_settings
+
+settings = get_settings()
+
+PREFIX = f'{cache.NAMESPACE}:counts'
+
+TOTAL_KEY = f'{PREFIX}:posts'
+USER_POSTS_KEY = f'{PREFIX}:user_posts'
+RECONCILE_LOCK_KEY = f'{PREFIX}:reconcile:lock'
+RECONCILE_LOCK_LEASE_MS = 60_000
+
+# Счетчики двигаются, только если уже заведены: иначе первое же изменение создало бы счетчик от нуля
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('INCRBY', KEYS[1], ARGV[2])
+end
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then
+    redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+# Пока шел подсчет в БД, счетчик продолжали менять записи: эта разница переносится поверх точного значения
+RECONCILE_TOTAL_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+local drift = 0
+if current and ARGV[1] ~= '' then
+    drift = tonumber(current) - tonumber(ARGV[1])
+end
+redis.call('SET', KEYS[1], tonumber(ARGV[2]) + drift)
+return tonumber(ARGV[2]) + drift
+"""
+
+RECONCILE_USERS_SCRIPT = """
+local fixed = 0
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    if current then
+        local value = tonumber(ARGV[i + 2]) + tonumber(current) - tonumber(ARGV[i + 1])
+        if value ~= tonumber(current) then
+            redis.call('HSET', KEYS[1], ARGV[i], value)
+            fixed = fixed + 1
+        end
+    end
+end
+return fixed
+"""
+
+
+async def add_posts(redis_client: redis.Redis, owner_id: int, delta: int):
+
+    if delta:
+        await redis_client.eval(ADD_SCRIPT, 2, TOTAL_KEY, USER_POSTS_KEY, owner_id, delta)
+
+
+async def count_posts(db: AsyncSession) -> int:
+    return await db.scalar(select(func.count()).select_from(models.Post))
+
+
+async def estimate_posts(db: AsyncSession) -> int:
+
+    # Точный count(*) на пути запроса и есть то, от чего уходим: только оценка планировщика из статистики.
+    # До первого ANALYZE там -1, а у SQLite статистики нет вовсе; тогда 0 до ближайшей сверки
+    if db.bind.dialect.name != 'postgresql':
+        return 0
+
+    estimate = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'posts'::regclass"))
+
+    return max(int(estimate or 0), 0)
+
+
+async def total_posts(redis_client: redis.Redis, db: AsyncSession) -> int:
+
+    total = await redis_client.get(TOTAL_KEY)
+
+    if total is not None:
+        return int(total)
+
+    total = await estimate_posts(db)
+
+    # Оценка служит отправной точкой, точное значение выставит сверка
+    await redis_client.set(TOTAL_KEY, total, nx=True)
+
+    return total
+
+
+async def user_posts_count(redis_client: redis.Redis, db: AsyncSession, user_id: int) -> int:
+
+    count = await redis_client.hget(USER_POSTS_KEY, user_id)
+
+    if count is not None:
+        return int(count)
+
+    # Посты одного пользователя считаются по индексу owner_id, это дешево
+    count = await db.scalar(select(func.count()).select_from(models.Post).where(models.Post.owner_id == user_id))
+
+    await redis_client.hsetnx(USER_POSTS_KEY, user_id, count)
+
+    return count
+
+
+def reconcile_sessionmaker(primary_sessionmaker):
+
+    # Полный подсчет тяжелый: он идет в реплику, а primary остается только без реплик.
+    # Отставание реплики дает дрейф в пределах лага, его поправит следующая сверка
+    replica = replicas.next_replica()
+
+    return primary_sessionmaker if replica is None else database.ReplicaSessionLocals[replica]
+
+
+async def reconcile(redis_client: redis.Redis, session_factory) -> bool:
+
+    token = secrets.token_hex(8)
+
+    # Сверяет одна реплика за раз
+    if not await redis_client.set(RECONCILE_LOCK_KEY, token, nx=True, px=RECONCILE_LOCK_LEASE_MS):
+        return False
+
+    try:
+        async with session_factory() as session:
+            before = await redis_client.get(TOTAL_KEY)
+
+            exact = await count_posts(session)
+
+            await redis_client.eval(RECONCILE_TOTAL_SCRIPT, 1, TOTAL_KEY, before or '', exact)
+
+            # Сверяются только заведенные счетчики; остальные посчитаются при первом чтении
+            cursor = 0
+
+            while True:
+                cursor, snapshot = await redis_client.hscan(USER_POSTS_KEY, cursor, count=settings.counts_reconcile_batch_size)
+
+                if snapshot:
+                    user_ids = [int(user_id) for user_id in snapshot]
+
+                    exact_counts = dict((await session.execute(
+                        select(models.Post.owner_id, func.count())
+                        .where(models.Post.owner_id.in_(user_ids))
+                        .group_by(models.Post.owner_id)
+                    )).all())
+
+                    args = []
+
+                    for user_id, value in snapshot.items():
+                        args += [user_id, value, exact_counts.get(int(user_id), 0)]
+
+                    fixed = await redis_client.eval(RECONCILE_USERS_SCRIPT, 1, USER_POSTS_KEY, *args)
+
+                    if fixed:
+                        logging.info(f'Исправлены счетчики постов пользователей: {fixed}')
+
+                if not cursor:
+                    break
+
+        return True
+    finally:
+        await redis_client.eval(cache.RELEASE_LOCK_SCRIPT, 1, RECONCILE_LOCK_KEY, token)
+
+
+async def run_reconciler(redis_client: redis.Redis, primary_sessionmaker):
+
+    # Первая сверка сразу при старте: счетчик мог быть заведен по оценке
+    while True:
+        try:
+            await reconcile(redis_client, reconcile_sessionmaker(primary_sessionmaker))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('Не удалось сверить счетчики постов')
+
+        await asyncio.sleep(settings.counts_reconcile_interval_seconds)
@@ -1,18 +1,108 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import time
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from . import query_stats
 from .config import get_settings
+from .metrics import DB_POOL_SIZE, DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_CHECKOUT_SECONDS, DB_QUERY_SECONDS
 
 settings = get_settings()
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    echo=True
-)
+QUERY_OPERATIONS = {'select', 'insert', 'update', 'delete', 'with'}
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # Событие checkout приходит уже после получения соединения, поэтому ожидание меряется здесь
+    engine_name = 'primary'
+
+    def _do_get(self):
+
+        start = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(engine=self.engine_name).observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine, name: str):
+
+    pool = engine.pool
+
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.engine_name = name
+
+    if hasattr(pool, 'checkedout'):
+        # Значения снимаются в момент сбора /metrics, без хуков на каждую выдачу
+        DB_POOL_SIZE.labels(engine=name).set_function(pool.size)
+        DB_POOL_CHECKED_OUT.labels(engine=name).set_function(pool.checkedout)
+        DB_POOL_OVERFLOW.labels(engine=name).set_function(pool.overflow)
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+
+        elapsed = time.perf_counter() - context._query_started_at
+
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+
+        DB_QUERY_SECONDS.labels(
+            engine=name,
+            operation=operation if operation in QUERY_OPERATIONS else 'other'
+        ).observe(elapsed)
+
+        query_stats.record(statement, elapsed)
+
+
+def engine_options(url: str) -> dict:
+
+    options = {'echo': settings.db_echo}
+
+    # SQLite в памяти живет на StaticPool, параметры пула к нему неприменимы
+    if url.startswith('sqlite'):
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping
+    )
+
+    if url.startswith('postgresql+asyncpg'):
+        options['connect_args'] = {
+            'statement_cache_size': settings.db_statement_cache_size,
+            'prepared_statement_cache_size': settings.db_statement_cache_size
+        }
+
+    return options
+
+
+def make_engine(url: str, name: str) -> AsyncEngine:
+
+    engine = create_async_engine(url, **engine_options(url))
+
+    instrument_engine(engine, name)
+
+    return engine
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL, 'primary')
 
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+replica_engines = [make_engine(url, f'replica{i}') for i, url in enumerate(settings.db_replica_urls)]
+
+ReplicaSessionLocals = [sessionmaker(bind=replica, class_=AsyncSession, expire_on_commit=False) for replica in replica_engines]
+
 Base = declarative_base()
-from . import models
\ No newline at end of file
+from . import models
@@ -1,19 +1,63 @@
+import logging
 import redis.asyncio as redis
-import json
-from fastapi.encoders import jsonable_encoder
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy import select
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import TypeAdapter
-from . import models, schemas
+from sqlalchemy.orm import sessionmaker, selectinload
+from . import models, cache, replicas
+from .clients import get_redis_client
+from .security import token_user_id
+from .pagination import next_cursor
+from .serialization import dumps_post_rows, encode_page
+from .config import get_settings
 from .database import AsyncSessionLocal
 
+settings = get_settings()
+
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
 
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db), redis_client: redis.Redis = Depends(get_redis_client)):
+
+    chosen = await replicas.choose_replica(redis_client, token_user_id(request.headers.get('Authorization')))
+
+    if chosen is None:
+        yield db
+        return
+
+    replica, session_factory = chosen
+
+    # Сессия primary из get_db ленивая: пока в нее не пишут, соединение не берется
+    async with session_factory() as session:
+        try:
+            # Соединение с репликой берется сразу: если она недоступна, этот же запрос уходит в primary
+            await session.connection()
+            reachable = True
+        except (OperationalError, InterfaceError, OSError):
+            logging.warning(f'Реплика {replica} недоступна, чтение идет в primary')
+            replicas.mark_down(replica)
+            reachable = False
+
+        if not reachable:
+            yield db
+            return
+
+        try:
+            yield session
+        except (OperationalError, InterfaceError, OSError):
+            replicas.mark_down(replica)
+            raise
+
+
+def get_sessionmaker():
+    # Для потоковых ответов и общих загрузок в кэш: сессия из get_db закрывается раньше, чем они закончатся
+    return AsyncSessionLocal
+
+
 async def get_user_by_username(username: str, db: AsyncSession) -> models.User:
 
     user_db_query = select(models.User).filter(models.User.username == username)
@@ -25,44 +69,84 @@ async def get_user_by_username(username: str, db: AsyncSession) -> models.User:
     return user_db
 
 
-async def get_post_by_id(post_id: int, db: AsyncSession = Depends(get_db)) -> models.Post:
-
-    db_post_query = select(models.Post).filter(models.Post.id == post_id)
-
-    db_post_result = await db.execute(db_post_query)
+async def post_write_miss(post_id: int, db: AsyncSession, forbidden_detail: str) -> HTTPException:
 
-    db_post = db_post_result.scalar_one_or_none()
+    # UPDATE/DELETE с проверкой владельца ничего не задел: отдельный запрос только чтобы отличить 404 от 403
+    post_exists = await db.scalar(select(models.Post.id).where(models.Post.id == post_id))
 
-    if not db_post:
-        raise HTTPException(
+    if post_exists is None:
+        return HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f'Пост №{post_id} не найден!'
         )
-    
-    return db_post
 
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=forbidden_detail
+    )
 
-async def get_posts_by_user_id(user_id:int, redis_client: redis.Redis, db: AsyncSession) -> list[schemas.Post]:
 
-    cache_key = str(user_id)
+async def get_feed_generation(redis_client: redis.Redis) -> int:
+    return await cache.current_generation(redis_client, cache.feed_generation_key(), 'feed:generation')
 
-    cache_posts = await redis_client.get(cache_key)
 
-    if cache_posts:
-        print('CACHE HIT')
+async def get_user_posts_generation(user_id: int, redis_client: redis.Redis) -> int:
+    return await cache.current_generation(redis_client, cache.user_posts_generation_key(user_id), f'user_posts:{user_id}:generation')
 
-        cache_posts_adapter = TypeAdapter(list[schemas.Post])
 
-        return cache_posts_adapter.validate_json(cache_posts)
-    
-    print('CACHE MISS')
+# Загрузка в кэш общая для всех ждущих ее запросов и переживает отмену первого из них,
+# поэтому берет свою сессию, а не сессию запроса, которую закроет get_db
+async def get_posts_by_user_id(user_id:int, redis_client: redis.Redis, session_factory: sessionmaker[AsyncSession], generation: int | None = None) -> bytes:
+
+    async def load_posts():
+
+        async with session_factory() as db:
+            db_result = await db.execute(select(models.Post).options(selectinload(models.Post.owner)).where(models.Post.owner_id == user_id).order_by(models.Post.created_at.desc(), models.Post.id.desc()))
+
+            return dumps_post_rows(db_result.scalars().all())
+
+    if generation is None:
+        generation = await get_user_posts_generation(user_id, redis_client)
+
+    # Наружу уходят байты из кэша как есть: без разбора и повторной сериализации
+    return await cache.get_two_tier(
+        redis_client,
+        f'user_posts:{user_id}:{generation}',
+        cache.user_posts_key(user_id, generation),
+        load_posts,
+        settings.user_posts_cache_ttl_seconds,
+        'user_posts',
+        bytes
+    )
+
+
+def feed_query():
+    return select(models.Post).options(selectinload(models.Post.owner)).order_by(models.Post.created_at.desc(), models.Post.id.desc())
+
+
+async def get_feed_page(limit: int, step: int, redis_client: redis.Redis, session_factory: sessionmaker[AsyncSession], generation: int | None = None) -> bytes:
+
+    async def load_page():
+
+        async with session_factory() as db:
+            db_result = await db.execute(feed_query().offset(step).limit(limit))
 
-    db_result = await db.execute(select(models.Post).where(models.Post.owner_id == user_id))
+            db_posts = db_result.scalars().all()
 
-    db_posts = db_result.scalars().all()
+            return encode_page(next_cursor(db_posts, limit), dumps_post_rows(db_posts))
 
-    pydantic_posts = [schemas.Post.model_validate(post) for post in db_posts]
+    if step + limit > settings.feed_cache_max_depth:
+        return await load_page()
 
-    await redis_client.set(cache_key, json.dumps(jsonable_encoder(pydantic_posts)), ex=600)
+    if generation is None:
+        generation = await get_feed_generation(redis_client)
 
-    return pydantic_posts
\ No newline at end of file
+    return await cache.get_two_tier(
+        redis_client,
+        f'feed:{generation}:{limit}:{step}',
+        cache.feed_page_key(generation, limit, step),
+        load_page,
+        settings.feed_cache_ttl_seconds,
+        'feed',
+        bytes
+    )
@@ -0,0 +1,81 @@
+import zlib
+from typing import AsyncIterator
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from . import models
+from .serialization import dumps_export_rows
+from .config import get_settings
+
+settings = get_settings()
+
+
+def export_query(owner_id: int | None = None):
+
+    query = select(
+        models.Post.id,
+        models.Post.title,
+        models.Post.content,
+        models.Post.created_at,
+        models.Post.likes_count,
+        models.Post.owner_id,
+        models.User.username.label('owner_username')
+    ).join(models.User, models.User.id == models.Post.owner_id).order_by(models.Post.id)
+
+    if owner_id is not None:
+        query = query.where(models.Post.owner_id == owner_id)
+
+    return query
+
+
+async def stream_ndjson(session_factory: sessionmaker[AsyncSession], query) -> AsyncIterator[bytes]:
+
+    async with session_factory() as session:
+        # yield_per включает серверный курсор: в памяти держится только текущая пачка строк,
+        # а следующая читается, когда клиент забрал предыдущую
+        result = await session.stream(query.execution_options(yield_per=settings.export_batch_size))
+
+        async for rows in result.partitions():
+            yield dumps_export_rows(rows)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+
+    compressor = zlib.compressobj(settings.export_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+
+    return False
+
+
+def export_response(session_factory: sessionmaker[AsyncSession], query, filename: str, accept_encoding: str | None) -> StreamingResponse:
+
+    chunks = stream_ndjson(session_factory, query)
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding'
+    }
+
+    if accepts_gzip(accept_encoding):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+
+    return StreamingResponse(chunks, media_type='application/x-ndjson', headers=headers)
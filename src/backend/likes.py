@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import secrets
+import redis.asyncio as redis
+from collections import Counter
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, exists, tuple_, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, cache
+from .config import get_settings
+from .serialization import posts_adapter, dumps_posts
+
+settings = get_settings()
+
+PREFIX = f'{cache.NAMESPACE}:likes'
+
+# Отложенные лайки: состояние пользователя по посту и накопленная разница в счетчике.
+# Во время сброса в БД данные переезжают в *:flushing, чтобы чтения продолжали их учитывать.
+DELTA_KEY = f'{PREFIX}:delta'
+FLUSHING_DELTA_KEY = f'{PREFIX}:delta:flushing'
+DIRTY_KEY = f'{PREFIX}:dirty'
+FLUSHING_KEY = f'{PREFIX}:dirty:flushing'
+FLUSH_LOCK_KEY = f'{PREFIX}:flush:lock'
+
+
+def state_key(post_id) -> str:
+    return f'{PREFIX}:state:{post_id}'
+
+
+def flushing_state_key(post_id) -> str:
+    return f'{PREFIX}:state:{post_id}:flushing'
+
+
+TOGGLE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current then current = redis.call('HGET', KEYS[2], ARGV[1]) end
+if not current then current = ARGV[2] end
+local liked = 1 - tonumber(current)
+redis.call('HSET', KEYS[1], ARGV[1], liked)
+local pending = redis.call('HINCRBY', KEYS[3], ARGV[3], liked == 1 and 1 or -1)
+redis.call('SADD', KEYS[5], ARGV[3])
+return {liked, pending + tonumber(redis.call('HGET', KEYS[4], ARGV[3]) or 0)}
+"""
+
+DRAIN_SCRIPT = """
+for _, post_id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    local state = ARGV[1] .. ':state:' .. post_id
+    local fields = redis.call('HGETALL', state)
+    for i = 1, #fields, 2 do
+        redis.call('HSET', state .. ':flushing', fields[i], fields[i + 1])
+    end
+    redis.call('DEL', state)
+    local delta = redis.call('HGET', KEYS[3], post_id)
+    if delta then
+        redis.call('HINCRBY', KEYS[4], post_id, delta)
+        redis.call('HDEL', KEYS[3], post_id)
+    end
+    redis.call('SADD', KEYS[2], post_id)
+end
+redis.call('DEL', KEYS[1])
+return redis.call('SMEMBERS', KEYS[2])
+"""
+
+# Чистит только владелец блокировки: если аренда истекла и другой сброс уже слил в *:flushing новые
+# переключения, удалять их нельзя. Данные остаются, следующий сброс применит их повторно (это безопасно)
+CLEANUP_SCRIPT = """
+if redis.call('GET', KEYS[3]) ~= ARGV[2] then
+    return -1
+end
+for i = 3, #ARGV do
+    redis.call('DEL', ARGV[1] .. ':state:' .. ARGV[i] .. ':flushing')
+    redis.call('HDEL', KEYS[2], ARGV[i])
+    redis.call('SREM', KEYS[1], ARGV[i])
+end
+return #ARGV - 2
+"""
+
+
+def insert_ignore(db: AsyncSession, table):
+
+    if db.bind.dialect.name == 'postgresql':
+        stmt = postgresql.insert(table)
+    else:
+        stmt = sqlite.insert(table)
+
+    return stmt.on_conflict_do_nothing()
+
+
+def not_found():
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Нет поста"
+    )
+
+
+async def toggle_like(db: AsyncSession, post_id: int, user_id: int) -> tuple[int, int, int]:
+
+    # Снять лайк, если он был, иначе поставить: без чтения и без гонок между запросами
+    removed = await db.execute(
+        delete(models.Like)
+        .where(models.Like.post_id == post_id, models.Like.user_id == user_id)
+        .returning(models.Like.id),
+        execution_options={'synchronize_session': False}
+    )
+
+    if removed.first():
+        delta = -1
+    else:
+        try:
+            added = await db.execute(
+                insert_ignore(db, models.Like).values(post_id=post_id, user_id=user_id).returning(models.Like.id)
+            )
+        except IntegrityError:
+            await db.rollback()
+            raise not_found()
+
+        # Параллельный запрос уже поставил этот лайк
+        delta = 1 if added.first() else 0
+
+    updated = await db.execute(
+        update(models.Post)
+        .where(models.Post.id == post_id)
+        .values(likes_count=models.Post.likes_count + delta)
+        .returning(models.Post.likes_count, models.Post.owner_id),
+        execution_options={'synchronize_session': False}
+    )
+
+    post_row = updated.first()
+
+    if not post_row:
+        await db.rollback()
+        raise not_found()
+
+    await db.commit()
+
+    return delta, post_row.likes_count, post_row.owner_id
+
+
+async def toggle_like_buffered(db: AsyncSession, redis_client: redis.Redis, post_id: int, user_id: int) -> tuple[int, int]:
+
+    liked_in_db = exists().where(models.Like.post_id == post_id, models.Like.user_id == user_id)
+
+    db_result = await db.execute(select(models.Post.likes_count, liked_in_db).where(models.Post.id == post_id))
+
+    post_row = db_result.first()
+
+    if not post_row:
+        raise not_found()
+
+    likes_count, liked = post_row
+
+    liked, pending = await redis_client.eval(
+        TOGGLE_SCRIPT, 5,
+        state_key(post_id), flushing_state_key(post_id), DELTA_KEY, FLUSHING_DELTA_KEY, DIRTY_KEY,
+        user_id, int(liked), post_id
+    )
+
+    return (1 if int(liked) else -1), likes_count + int(pending)
+
+
+async def merge_pending(redis_client: redis.Redis, posts: list[schemas.Post]) -> list[schemas.Post]:
+
+    if not settings.likes_write_behind or not posts:
+        return posts
+
+    post_ids = [post.id for post in posts]
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hmget(DELTA_KEY, post_ids)
+        pipe.hmget(FLUSHING_DELTA_KEY, post_ids)
+
+        pending, flushing = await pipe.execute()
+
+    # Посты из локального кэша общие для всех запросов, поэтому копии, а не правка на месте
+    return [
+        post.model_copy(update={'likes_count': post.likes_count + int(delta or 0) + int(flushing_delta or 0)})
+        if delta or flushing_delta else post
+        for post, delta, flushing_delta in zip(posts, pending, flushing)
+    ]
+
+
+async def merge_pending_json(redis_client: redis.Redis, body: bytes) -> bytes:
+
+    # Без отложенных лайков байты из кэша уходят клиенту без разбора
+    if not settings.likes_write_behind:
+        return body
+
+    return dumps_posts(await merge_pending(redis_client, posts_adapter.validate_json(body)))
+
+
+async def flush_pending_likes(redis_client: redis.Redis, session_factory) -> int:
+
+    token = secrets.token_hex(8)
+
+    # Сбрасывает одна реплика за раз; чужие отложенные лайки она заберет вместе со своими
+    if not await redis_client.set(FLUSH_LOCK_KEY, token, nx=True, px=settings.likes_flush_lock_lease_ms):
+        return 0
+
+    heartbeat = asyncio.create_task(keep_flush_lock(redis_client, token))
+
+    try:
+        post_ids = await redis_client.eval(DRAIN_SCRIPT, 4, DIRTY_KEY, FLUSHING_KEY, DELTA_KEY, FLUSHING_DELTA_KEY, PREFIX)
+
+        if not post_ids:
+            return 0
+
+        post_ids = [int(post_id) for post_id in post_ids]
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for post_id in post_ids:
+                pipe.hgetall(flushing_state_key(post_id))
+
+            states = await pipe.execute()
+
+        async with session_factory() as session:
+            existing = set(await session.scalars(select(models.Post.id).where(models.Post.id.in_(post_ids))))
+
+            liked, unliked = [], []
+
+            for post_id, state in zip(post_ids, states):
+                if post_id not in existing:
+                    continue
+
+                for user_id, value in state.items():
+                    row = {'post_id': post_id, 'user_id': int(user_id)}
+
+                    (liked if int(value) else unliked).append(row)
+
+            # Счетчики считаются по реально измененным строкам, поэтому повторный сброс безопасен
+            changes = Counter()
+
+            if liked:
+                inserted = await session.execute(
+                    insert_ignore(session, models.Like.__table__).values(liked).returning(models.Like.post_id)
+                )
+
+                changes.update(inserted.scalars().all())
+
+            if unliked:
+                deleted = await session.execute(
+                    delete(models.Like.__table__)
+                    .where(tuple_(models.Like.post_id, models.Like.user_id).in_([(row['post_id'], row['user_id']) for row in unliked]))
+                    .returning(models.Like.post_id)
+                )
+
+                changes.subtract(deleted.scalars().all())
+
+            changes = {post_id: delta for post_id, delta in changes.items() if delta}
+
+            owner_ids = []
+
+            if changes:
+                posts_table = models.Post.__table__
+
+                await session.execute(
+                    update(posts_table)
+                    .where(posts_table.c.id == bindparam('changed_id'))
+                    .values(likes_count=posts_table.c.likes_count + bindparam('delta')),
+                    [{'changed_id': post_id, 'delta': delta} for post_id, delta in changes.items()]
+                )
+
+                owner_ids = list(await session.scalars(
+                    select(models.Post.owner_id).where(models.Post.id.in_(changes)).distinct()
+                ))
+
+            # Аренда потеряна: сброс уже мог начать другой, и его более свежий снимок нельзя перетереть старым
+            if await redis_client.get(FLUSH_LOCK_KEY) != token.encode():
+                await session.rollback()
+                logging.warning('Блокировка сброса лайков потеряна до коммита, сброс отменен')
+                return 0
+
+            await session.commit()
+
+        # Между коммитом и очисткой чтения видят likes_count из БД плюс FLUSHING_DELTA_KEY: счетчик завышен
+        # не больше чем на разницу этого сброса и только до очистки. Если очистка пропущена из-за потерянной
+        # аренды, завышение держится до следующего сброса: он применит тот же снимок вхолостую и очистит его
+        if await redis_client.eval(CLEANUP_SCRIPT, 3, FLUSHING_KEY, FLUSHING_DELTA_KEY, FLUSH_LOCK_KEY, PREFIX, token, *post_ids) < 0:
+            logging.warning('Блокировка сброса лайков потеряна после коммита, очистка оставлена следующему сбросу')
+
+        if owner_ids:
+            await cache.invalidate_posts(redis_client, *owner_ids)
+
+        return len(post_ids)
+    finally:
+        heartbeat.cancel()
+
+        await redis_client.eval(cache.RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+
+
+async def keep_flush_lock(redis_client: redis.Redis, token: str):
+
+    lease_ms = settings.likes_flush_lock_lease_ms
+
+    # Долгий сброс (медленная БД, большая пачка) продлевает аренду, пока блокировка еще его
+    while True:
+        await asyncio.sleep(lease_ms / 3000)
+
+        if not await redis_client.eval(cache.EXTEND_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token, lease_ms):
+            return
+
+
+async def run_like_flusher(redis_client: redis.Redis, session_factory):
+
+    while True:
+        await asyncio.sleep(settings.likes_flush_interval_ms / 1000)
+
+        try:
+            await flush_pending_likes(redis_client, session_factory)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('Не удалось сбросить отложенные лайки в БД')
+
+
+async def drain_pending_likes(redis_client: redis.Redis, session_factory, timeout: float = 10.0):
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    # Блокировку может держать другая реплика: ждем, пока очередь не опустеет
+    while loop.time() < deadline:
+        await flush_pending_likes(redis_client, session_factory)
+
+        if not await redis_client.exists(DIRTY_KEY, FLUSHING_KEY):
+            return
+
+        await asyncio.sleep(settings.likes_flush_interval_ms / 1000)
+
+    logging.warning('Не все отложенные лайки успели попасть в БД до остановки')
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from .metrics import CACHE_EVICTIONS
+
+
+class LocalCache:
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        # Растет при каждой инвалидации: загрузка, начатая до нее, не должна попасть в кэш
+        self.version = 0
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0 and self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires_at, _, value = entry
+
+        if expires_at <= time.monotonic():
+            self._remove(key, 'expired')
+            return None
+
+        self._entries.move_to_end(key)
+
+        return value
+
+    def set(self, key: str, value, size: int, ttl: float | None = None):
+
+        if not self.enabled or size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), size, value)
+        self.size_bytes += size
+
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)), 'capacity')
+
+    def delete(self, key: str):
+
+        self.version += 1
+
+        if key in self._entries:
+            self._remove(key, 'invalidated')
+
+    def delete_prefix(self, prefix: str):
+
+        self.version += 1
+
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key, 'invalidated')
+
+    def clear(self):
+
+        self.version += 1
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str, reason: str | None = None):
+
+        _, size, _ = self._entries.pop(key)
+        self.size_bytes -= size
+
+        if reason:
+            CACHE_EVICTIONS.labels(tier='local', cache=self.name, reason=reason).inc()
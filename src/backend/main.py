@@ -1,10 +1,14 @@
+import asyncio
 import logging
 import redis.asyncio as redis
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from prometheus_fastapi_instrumentator import Instrumentator
-from .routers import auth, posts
-from . import clients
+from .routers import auth, posts, feed
+from . import clients, cache, likes, trending, counts
+from .query_stats import QueryStatsMiddleware
+from .database import AsyncSessionLocal
 from .config import get_settings
 
 settings = get_settings()
@@ -20,17 +24,45 @@ async def lifespan(app: FastAPI):
     logging.info("Инициализирую redis_client")
 
     clients.redis_client = redis.from_url(
-        settings.redis_url, encoding="utf-8", decode_responses=True
+        settings.redis_url
     )
 
+    try:
+        await trending.rebuild_if_missing(clients.redis_client, AsyncSessionLocal)
+    except Exception:
+        # Без рейтинга приложение работает, он наполнится новыми лайками
+        logging.exception("Не удалось собрать рейтинг популярных постов")
+
+    background_tasks = [
+        asyncio.create_task(cache.listen_invalidations(clients.redis_client)),
+        asyncio.create_task(trending.run_trimmer(clients.redis_client)),
+        asyncio.create_task(counts.run_reconciler(clients.redis_client, AsyncSessionLocal)),
+    ]
+
+    if settings.likes_write_behind:
+        logging.info("Запускаю фоновый сброс лайков в БД")
+
+        background_tasks.append(asyncio.create_task(likes.run_like_flusher(clients.redis_client, AsyncSessionLocal)))
+
     yield
 
+    for task in background_tasks:
+        task.cancel()
+
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    if settings.likes_write_behind:
+        # Под может быть остановлен: отложенные лайки не должны остаться только в Redis
+        await likes.drain_pending_likes(clients.redis_client, AsyncSessionLocal)
+
     logging.info("Приложение остановлено")
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(QueryStatsMiddleware)
 instrumentator = Instrumentator().instrument(app)
 instrumentator.expose(app)
 
 app.include_router(auth.router)
 app.include_router(posts.router)
+app.include_router(feed.router)
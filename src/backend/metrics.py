@@ -0,0 +1,96 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+CACHE_REQUESTS = Counter(
+    'blog_cache_requests_total',
+    'Обращения к кэшу по уровню и результату (hit/miss)',
+    ['cache', 'tier', 'result']
+)
+
+CACHE_EVICTIONS = Counter(
+    'blog_cache_evictions_total',
+    'Вытеснения из кэша по уровню и причине',
+    ['tier', 'cache', 'reason']
+)
+
+CACHE_COALESCED = Counter(
+    'blog_cache_coalesced_requests_total',
+    'Промахи, дождавшиеся чужой загрузки вместо запроса в БД',
+    ['cache', 'scope']
+)
+
+CACHE_EARLY_REFRESHES = Counter(
+    'blog_cache_early_refreshes_total',
+    'Вероятностные обновления до истечения TTL',
+    ['cache']
+)
+
+PASSWORD_HASH_PENDING = Gauge(
+    'blog_password_hash_pending',
+    'Операции bcrypt в пуле и в очереди к нему'
+)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    'blog_password_hash_seconds',
+    'Время операции bcrypt вместе с ожиданием в очереди',
+    ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    'blog_password_hash_rejected_total',
+    'Операции bcrypt, отклоненные из-за переполненной очереди (503)',
+    ['operation']
+)
+
+DB_POOL_SIZE = Gauge(
+    'blog_db_pool_size',
+    'Постоянные соединения пула',
+    ['engine']
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'blog_db_pool_checked_out',
+    'Соединения, выданные из пула',
+    ['engine']
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    'blog_db_pool_overflow',
+    'Соединения сверх pool_size (отрицательное значение: еще не открытые постоянные)',
+    ['engine']
+)
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    'blog_db_pool_checkout_seconds',
+    'Ожидание соединения из пула',
+    ['engine'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+
+DB_QUERY_SECONDS = Histogram(
+    'blog_db_query_seconds',
+    'Время выполнения SQL-запроса по типу оператора',
+    ['engine', 'operation'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+DB_REQUEST_QUERIES = Histogram(
+    'blog_db_request_queries',
+    'Количество SQL-запросов за один HTTP-запрос',
+    ['method', 'handler'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+)
+
+DB_REQUEST_QUERY_SECONDS = Histogram(
+    'blog_db_request_query_seconds',
+    'Суммарное время SQL-запросов за один HTTP-запрос',
+    ['method', 'handler'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+DB_REPEATED_STATEMENTS = Counter(
+    'blog_db_repeated_statements_total',
+    'HTTP-запросы, повторившие один и тот же SQL больше порога (вероятный N+1)',
+    ['method', 'handler']
+)
@@ -1,7 +1,24 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, UniqueConstraint, Index, DDL, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from .database import Base
 from sqlalchemy.orm import relationship
-from datetime import datetime
+
+
+class utcnow(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow, 'sqlite')
+def _sqlite_utcnow(element, compiler, **kw):
+    # Тот же формат, что пишет SQLAlchemy, иначе сравнение строк в курсоре ломается
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
 
 
 class Post(Base):
@@ -10,7 +27,7 @@ class Post(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(String)
-    created_at = Column(DateTime, default=datetime.now())
+    created_at = Column(DateTime, nullable=False, server_default=utcnow())
     likes_count = Column(Integer, nullable=False, server_default='0')
 
     owner_id = Column(Integer, ForeignKey('users.id'))
@@ -18,13 +35,53 @@ class Post(Base):
     owner = relationship('User', back_populates='posts')
     likes = relationship('Like', back_populates='post')
 
+    __table_args__ = (
+        Index('ix_posts_created_at_id', created_at.desc(), id.desc()),
+        Index('ix_posts_owner_id_created_at_id', owner_id, created_at.desc(), id.desc()),
+    )
+
+    __mapper_args__ = {'eager_defaults': True}
+
+
+# Полнотекстовый поиск: в PostgreSQL сгенерированный tsvector с GIN-индексом (см. миграцию),
+# в SQLite (тесты) внешняя FTS5-таблица, которую поддерживают триггеры
+POSTS_SEARCH_DDL = {
+    'postgresql': [
+        """ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(content, '')), 'B')
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, content='posts', content_rowid='id')",
+        """CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+        """CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        END""",
+        """CREATE TRIGGER posts_fts_update AFTER UPDATE OF title, content ON posts BEGIN
+            INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+    ],
+}
+
+for dialect, statements in POSTS_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Post.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+event.listen(Post.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS posts_fts').execute_if(dialect='sqlite'))
+
 
 class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, index=True)
+    username = Column(String, index=True, unique=True)
     password_hash = Column(String)
+    followers_count = Column(Integer, nullable=False, server_default='0')
 
     posts = relationship('Post', back_populates='owner')
     likes = relationship('Like', back_populates='user')
@@ -40,4 +97,19 @@ class Like(Base):
     post = relationship('Post', back_populates='likes')
     user = relationship('User', back_populates='likes')
 
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='_user_post_uc'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='_user_post_uc'),)
+
+
+class Follow(Base):
+    __tablename__ = 'follows'
+
+    id = Column(Integer, primary_key=True, index=True)
+    follower_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    followee_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=utcnow())
+
+    # Уникальность покрывает "на кого подписан" (follower_id первым), отдельный индекс нужен для "кто подписан"
+    __table_args__ = (
+        UniqueConstraint('follower_id', 'followee_id', name='_follower_followee_uc'),
+        Index('ix_follows_followee_id', 'followee_id'),
+    )
@@ -0,0 +1,76 @@
+import base64
+import binascii
+from datetime import datetime
+from fastapi import HTTPException, status
+
+
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor: str) -> list[str]:
+
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise bad_cursor()
+
+
+def bad_cursor():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail='Некорректный курсор'
+    )
+
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    return _encode(f'{created_at.isoformat()}|{post_id}')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+
+    try:
+        created_at, post_id = _decode(cursor)
+
+        return datetime.fromisoformat(created_at), int(post_id)
+    except ValueError:
+        raise bad_cursor()
+
+
+def next_cursor(posts: list, limit: int) -> str | None:
+
+    if len(posts) < limit or not posts:
+        return None
+
+    last = posts[-1]
+
+    return encode_cursor(last.created_at, last.id)
+
+
+def encode_rank_cursor(rank: float, post_id: int) -> str:
+    # repr сохраняет float без потерь, чтобы сравнение в БД совпало точно
+    return _encode(f'{rank!r}|{post_id}')
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+
+    try:
+        rank, post_id = _decode(cursor)
+
+        return float(rank), int(post_id)
+    except ValueError:
+        raise bad_cursor()
+
+
+def encode_id_cursor(post_id: int) -> str:
+    return _encode(str(post_id))
+
+
+def decode_id_cursor(cursor: str) -> int:
+
+    try:
+        post_id, = _decode(cursor)
+
+        return int(post_id)
+    except ValueError:
+        raise bad_cursor()
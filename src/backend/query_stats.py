@@ -0,0 +1,96 @@
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .config import get_settings
+from .metrics import DB_REQUEST_QUERIES, DB_REQUEST_QUERY_SECONDS, DB_REPEATED_STATEMENTS
+
+settings = get_settings()
+
+# Списки параметров IN (...) разной длины и плейсхолдеры asyncpg ($1) сводятся к одной форме
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_NUMBERED_PARAM = re.compile(r'\$\d+')
+
+
+class QueryStats:
+
+    def __init__(self, parent: 'QueryStats | None' = None):
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+
+_current: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub('(?)', _NUMBERED_PARAM.sub('?', statement))
+
+
+def record(statement: str, seconds: float):
+
+    stats = _current.get()
+
+    if stats is None:
+        return
+
+    shape = statement_shape(statement)
+
+    # Вложенные счетчики (запрос внутри capture_queries в тестах) видят запросы друг друга
+    while stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+        stats.shapes[shape] += 1
+
+        stats = stats.parent
+
+
+@contextmanager
+def capture_queries():
+
+    stats = QueryStats(parent=_current.get())
+
+    token = _current.set(stats)
+
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryStatsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with capture_queries() as stats:
+            await self.app(scope, receive, send)
+
+        route = scope.get('route')
+
+        if route is None:
+            return
+
+        # Шаблон пути, а не сам путь: иначе у метрик будет метка на каждый id поста
+        method, handler = scope['method'], route.path
+
+        DB_REQUEST_QUERIES.labels(method=method, handler=handler).observe(stats.count)
+        DB_REQUEST_QUERY_SECONDS.labels(method=method, handler=handler).observe(stats.seconds)
+
+        if not stats.shapes:
+            return
+
+        shape, repeats = stats.shapes.most_common(1)[0]
+
+        if repeats > settings.query_repeat_warning_threshold:
+            DB_REPEATED_STATEMENTS.labels(method=method, handler=handler).inc()
+
+            logging.warning('Похоже на N+1: %s %s выполнил один и тот же запрос %d раз: %s', method, handler, repeats, shape)
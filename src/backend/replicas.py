@@ -0,0 +1,61 @@
+import itertools
+import time
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from . import cache, database
+from .config import get_settings
+
+settings = get_settings()
+
+_round_robin = itertools.count()
+
+# Реплика, на которой оборвалось соединение, пропускается до указанного момента
+_down_until: dict[int, float] = {}
+
+
+def recent_write_key(user_id: int) -> str:
+    return f'{cache.NAMESPACE}:recent_write:{user_id}'
+
+
+async def mark_write(redis_client: redis.Redis, user_id: int):
+
+    if not database.ReplicaSessionLocals:
+        return
+
+    # Пока ключ жив, чтения этого пользователя идут в primary: реплика может еще не догнать запись
+    await redis_client.set(recent_write_key(user_id), 1, px=settings.read_your_writes_ms)
+
+
+def mark_down(replica: int):
+    _down_until[replica] = time.monotonic() + settings.db_replica_retry_seconds
+
+
+def next_replica() -> int | None:
+
+    count = len(database.ReplicaSessionLocals)
+    now = time.monotonic()
+
+    for _ in range(count):
+        replica = next(_round_robin) % count
+
+        if _down_until.get(replica, 0) <= now:
+            return replica
+
+    return None
+
+
+async def choose_replica(redis_client: redis.Redis, user_id: int | None) -> tuple[int, sessionmaker[AsyncSession]] | None:
+
+    if not database.ReplicaSessionLocals:
+        return None
+
+    if user_id is not None and await redis_client.exists(recent_write_key(user_id)):
+        return None
+
+    replica = next_replica()
+
+    if replica is None:
+        return None
+
+    return replica, database.ReplicaSessionLocals[replica]
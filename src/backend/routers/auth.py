@@ -1,11 +1,12 @@
+import time
 import redis.asyncio as redis
 from fastapi import APIRouter, status, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from jose import JWTError, jwt
-from .. import models, schemas, security
-from ..dependencies import get_db, get_user_by_username
+from .. import models, schemas, security, cache, replicas
+from ..dependencies import get_db, get_read_db, get_user_by_username
 from ..clients import get_redis_client
 
 router = APIRouter(
@@ -16,7 +17,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
 
 @router.post('/register', response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db), redis_client: redis.Redis = Depends(get_redis_client)):
 
     user_db = await get_user_by_username(user.username, db)
 
@@ -26,14 +27,28 @@ async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db))
             detail="Пользователь с таким ником уже есть!"
         )
     
-    password_hash = security.hash_password(user.password)
+    password_hash = await security.hash_password_async(user.password)
     
     user_db = models.User(username=user.username, password_hash=password_hash)
 
     db.add(user_db)
-    await db.commit()
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Тот же ник успели занять между проверкой и вставкой: ловит уникальный индекс
+        await db.rollback()
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Пользователь с таким ником уже есть!"
+        )
+
     await db.refresh(user_db)
 
+    # Сразу после регистрации клиент входит и читает: реплика может еще не знать пользователя
+    await replicas.mark_write(redis_client, user_db.id)
+
     return user_db
 
 
@@ -51,15 +66,21 @@ async def login(user: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
         )
         
     
-    if not security.verify_password(user.password, db_user.password_hash):
+    verified, new_password_hash = await security.verify_and_update_password(user.password, db_user.password_hash)
+
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Неправильный ник или пароль',
             headers={'WWW-Authenticate': 'Bearer'}
         )
         
+    if new_password_hash:
+        db_user.password_hash = new_password_hash
+        await db.commit()
+
     
-    user_data = {'sub': db_user.username}
+    user_data = {'sub': db_user.username, 'uid': db_user.id}
 
     access_token = security.create_access_token(data=user_data)
     
@@ -69,7 +90,7 @@ async def login(user: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     }
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)) -> schemas.User:
 
     credential_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -85,18 +106,34 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         if not username:
             raise credential_exception
         
-        tokenData = schemas.TokenData(username=username)
+        tokenData = schemas.TokenData(username=username, user_id=payload.get('uid'))
     except JWTError:
         raise credential_exception
     
 
-    db_user_query = select(models.User).filter(models.User.username == tokenData.username)
+    if tokenData.user_id is not None:
+        cached_user = cache.local_users_cache.get(str(tokenData.user_id))
 
-    db_user_result = await db.execute(db_user_query)
+        if cached_user is not None:
+            return cached_user
 
-    db_user = db_user_result.scalar_one_or_none()
+        db_user = await db.get(models.User, tokenData.user_id)
+    else:
+        # Токены, выданные до появления uid
+        db_user = await get_user_by_username(tokenData.username, db)
 
     if not db_user:
         raise credential_exception
     
-    return db_user
\ No newline at end of file
+    current_user = schemas.User.model_validate(db_user)
+
+    if tokenData.user_id is not None:
+        # Запись не должна пережить токен, по которому ее положили
+        cache.local_users_cache.set(
+            str(current_user.id),
+            current_user,
+            size=len(current_user.username) + 64,
+            ttl=min(cache.local_users_cache.ttl, payload['exp'] - time.time())
+        )
+
+    return current_user
@@ -0,0 +1,67 @@
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, status, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from .. import models, schemas, likes, timeline, replicas
+from . import auth
+from ..dependencies import get_db
+from ..clients import get_redis_client
+from ..pagination import encode_id_cursor, decode_id_cursor
+from ..serialization import dumps_post_rows, json_response
+
+router = APIRouter()
+
+
+@router.post('/user/{user_id}/follow', response_model=schemas.FollowResult, status_code=status.HTTP_200_OK)
+async def follow(user_id: int, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
+
+    if user_id == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Нельзя подписаться на самого себя'
+        )
+
+    changed, followers_count = await timeline.follow(db, redis_client, current_user.id, user_id)
+
+    if changed:
+        await replicas.mark_write(redis_client, current_user.id)
+
+    return {
+        'detail': 'Подписка оформлена' if changed else 'Вы уже подписаны',
+        'followers_count': followers_count
+    }
+
+
+@router.delete('/user/{user_id}/follow', response_model=schemas.FollowResult, status_code=status.HTTP_200_OK)
+async def unfollow(user_id: int, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
+
+    changed, followers_count = await timeline.unfollow(db, redis_client, current_user.id, user_id)
+
+    if changed:
+        await replicas.mark_write(redis_client, current_user.id)
+
+    return {
+        'detail': 'Подписка отменена' if changed else 'Вы не были подписаны',
+        'followers_count': followers_count
+    }
+
+
+@router.get('/feed', response_model=list[schemas.Post], status_code=status.HTTP_200_OK)
+async def get_feed(limit: int = Query(50, ge=1, le=100), cursor: str | None = None, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
+
+    post_ids = await timeline.read_timeline(db, redis_client, current_user.id, limit, decode_id_cursor(cursor) if cursor else None)
+
+    db_result = await db.execute(select(models.Post).options(selectinload(models.Post.owner)).where(models.Post.id.in_(post_ids)))
+
+    # Удаленные посты могут еще лежать в лентах: их просто нет в выборке
+    posts = sorted(db_result.scalars().all(), key=lambda post: post.id, reverse=True)
+
+    body = await likes.merge_pending_json(redis_client, dumps_post_rows(posts))
+
+    headers = {'Cache-Control': 'private, no-cache'}
+
+    if len(post_ids) == limit:
+        headers['X-Next-Cursor'] = encode_id_cursor(post_ids[-1])
+
+    return json_response(body, headers=headers)
@@ -1,117 +1,240 @@
 import redis.asyncio as redis
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, BackgroundTasks, Depends, status, HTTPException, Query, Header, Request
+from sqlalchemy import tuple_, select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from .. import models, schemas
+from sqlalchemy.orm import sessionmaker, selectinload
+from .. import models, schemas, cache, likes, search, export, bulk, replicas, timeline, trending, counts
 from . import auth
-from ..dependencies import get_db, get_post_by_id, get_posts_by_user_id
+from ..dependencies import get_db, get_read_db, get_sessionmaker, post_write_miss, get_posts_by_user_id, get_feed_page, feed_query, get_feed_generation, get_user_posts_generation
 from ..clients import get_redis_client
+from ..pagination import encode_cursor, decode_cursor, next_cursor, encode_rank_cursor, decode_rank_cursor
+from ..serialization import dumps_post_rows, decode_page, json_response
+from ..conditional import make_etag, etag_matches, not_modified, FEED_CACHE_CONTROL, USER_POSTS_CACHE_CONTROL, SEARCH_CACHE_CONTROL, TRENDING_CACHE_CONTROL
+from ..config import get_settings
+
+settings = get_settings()
 
 router = APIRouter()
 
+
+def post_with_owner(post: models.Post, owner: schemas.User) -> schemas.Post:
+    # Владелец уже известен из токена, поэтому связь owner не подгружается отдельным запросом
+    return schemas.Post(
+        id=post.id,
+        title=post.title,
+        content=post.content,
+        created_at=post.created_at,
+        likes_count=post.likes_count,
+        owner=owner
+    )
+
+
 @router.post('/posts', response_model=schemas.Post, status_code=status.HTTP_201_CREATED)
-async def create_post(post: schemas.PostCreate, db: AsyncSession = Depends(get_db), current_user = Depends(auth.get_current_user)):
+async def create_post(post: schemas.PostCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client), session_factory: sessionmaker = Depends(get_sessionmaker)):
 
     new_post = models.Post(**post.model_dump(), owner_id = current_user.id)
 
     db.add(new_post)
+    # created_at и likes_count возвращаются самим INSERT (eager_defaults), refresh не нужен
     await db.commit()
-    await db.refresh(new_post)
 
-    return new_post
+    await cache.invalidate_posts(redis_client, current_user.id)
+    await replicas.mark_write(redis_client, current_user.id)
+    await counts.add_posts(redis_client, current_user.id, 1)
+
+    background_tasks.add_task(timeline.fan_out_after_response, redis_client, session_factory, new_post.id, current_user.id)
+
+    return post_with_owner(new_post, current_user)
+
+
+@router.post('/posts/bulk', response_model=schemas.BulkImportResult, status_code=status.HTTP_200_OK)
+async def bulk_create_posts(request: Request, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
+    # Тело читается вручную: это либо JSON-массив, либо поток NDJSON
+    result = await bulk.import_posts(request, db, redis_client, current_user.id)
+
+    await replicas.mark_write(redis_client, current_user.id)
+
+    return result
 
 
 @router.get('/posts', response_model=list[schemas.Post], status_code=status.HTTP_200_OK)
-async def get_posts(step: int=0, limit: int=100, db: AsyncSession = Depends(get_db)):
+async def get_posts(step: int=0, limit: int=100, cursor: str | None = None, if_none_match: str | None = Header(None), redis_client: redis.Redis = Depends(get_redis_client), db: AsyncSession = Depends(get_db), read_db: AsyncSession = Depends(get_read_db), session_factory: sessionmaker = Depends(get_sessionmaker)):
+
+    after = decode_cursor(cursor) if cursor else None
+
+    generation = await get_feed_generation(redis_client)
+
+    headers = {'Cache-Control': FEED_CACHE_CONTROL}
+
+    # Отложенные лайки меняют тело без смены поколения, поэтому в этом режиме ETag не выдается.
+    # Страница по курсору из отстающей реплики тоже без ETag: поколение взято из primary, и старое тело
+    # закрепилось бы под ним до следующей записи
+    if not settings.likes_write_behind and not (after and read_db is not db):
+        headers['ETag'] = make_etag('feed', generation, limit, f'c{encode_cursor(*after)}' if after else f's{step}')
+
+        if etag_matches(if_none_match, headers['ETag']):
+            return not_modified(headers)
+
+    if after:
+        results_start = feed_query().where(tuple_(models.Post.created_at, models.Post.id) < tuple_(*after)).limit(limit)
+
+        results_data = await read_db.execute(results_start)
+
+        posts = results_data.scalars().all()
+
+        cursor_next, body = next_cursor(posts, limit), dumps_post_rows(posts)
+    else:
+        # Кэш страниц общий для всех: заполнять его из отстающей реплики нельзя, иначе старая страница
+        # закрепится под новым поколением (и его ETag)
+        cursor_next, body = decode_page(await get_feed_page(limit, step, redis_client, session_factory, generation))
+
+    body = await likes.merge_pending_json(redis_client, body)
+
+    # Приблизительное значение: счетчик в Redis, сверяемый с БД в фоне
+    headers['X-Total-Count'] = str(await counts.total_posts(redis_client, read_db))
+
+    if cursor_next:
+        headers['X-Next-Cursor'] = cursor_next
+
+    return json_response(body, headers=headers)
+
+
+@router.get('/posts/search', response_model=list[schemas.Post], status_code=status.HTTP_200_OK)
+async def search_posts(q: str = Query(min_length=1, max_length=200), limit: int = Query(20, ge=1, le=100), cursor: str | None = None, redis_client: redis.Redis = Depends(get_redis_client), db: AsyncSession = Depends(get_read_db)):
+
+    found = await search.search_posts(db, q, limit, decode_rank_cursor(cursor) if cursor else None)
+
+    headers = {'Cache-Control': SEARCH_CACHE_CONTROL}
+
+    if len(found) == limit:
+        last_post, last_rank = found[-1]
+
+        headers['X-Next-Cursor'] = encode_rank_cursor(last_rank, last_post.id)
 
-    results_start = select(models.Post).options(selectinload(models.Post.owner)).order_by(models.Post.created_at.desc()).offset(step).limit(limit)
-    
-    results_data = await db.execute(results_start)
+    body = await likes.merge_pending_json(redis_client, dumps_post_rows([post for post, _ in found]))
 
-    posts = results_data.scalars().all()
+    return json_response(body, headers=headers)
 
-    return posts
+
+@router.get('/posts/trending', response_model=list[schemas.Post], status_code=status.HTTP_200_OK)
+async def get_trending_posts(step: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100), redis_client: redis.Redis = Depends(get_redis_client), db: AsyncSession = Depends(get_read_db)):
+
+    post_ids = await trending.trending_post_ids(redis_client, limit, step)
+
+    db_result = await db.execute(select(models.Post).options(selectinload(models.Post.owner)).where(models.Post.id.in_(post_ids)))
+
+    # Порядок задает рейтинг, а не БД
+    posts_by_id = {post.id: post for post in db_result.scalars().all()}
+
+    body = await likes.merge_pending_json(redis_client, dumps_post_rows([posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]))
+
+    return json_response(body, headers={'Cache-Control': TRENDING_CACHE_CONTROL})
+
+
+@router.get('/posts/export', status_code=status.HTTP_200_OK)
+async def export_posts(accept_encoding: str | None = Header(None), session_factory: sessionmaker = Depends(get_sessionmaker)):
+    return export.export_response(session_factory, export.export_query(), 'posts.ndjson', accept_encoding)
 
 
 @router.get('/user/posts', response_model=list[schemas.Post], status_code=status.HTTP_200_OK)
-async def get_user_posts(current_user = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client), db: AsyncSession = Depends(get_db)):
-    
-    posts = await get_posts_by_user_id(current_user.id, redis_client, db)
+async def get_user_posts(if_none_match: str | None = Header(None), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client), db: AsyncSession = Depends(get_db), session_factory: sessionmaker = Depends(get_sessionmaker)):
 
-    if not posts:
+    generation = await get_user_posts_generation(current_user.id, redis_client)
+
+    headers = {'Cache-Control': USER_POSTS_CACHE_CONTROL}
+
+    if not settings.likes_write_behind:
+        headers['ETag'] = make_etag('user_posts', current_user.id, generation)
+
+        if etag_matches(if_none_match, headers['ETag']):
+            return not_modified(headers)
+
+    # Как и лента: кэш общий, а поколение владельца меняют и чужие лайки, которых read-your-writes не видит,
+    # поэтому заполняется он только из primary
+    body = await get_posts_by_user_id(current_user.id, redis_client, session_factory, generation)
+
+    if body == b'[]':
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='У вас пока нет постов'
         )
-    
-    return posts
+
+    headers['X-Total-Count'] = str(await counts.user_posts_count(redis_client, db, current_user.id))
+
+    return json_response(await likes.merge_pending_json(redis_client, body), headers=headers)
+
+
+@router.get('/user/posts/export', status_code=status.HTTP_200_OK)
+async def export_user_posts(accept_encoding: str | None = Header(None), current_user: schemas.User = Depends(auth.get_current_user), session_factory: sessionmaker = Depends(get_sessionmaker)):
+    return export.export_response(session_factory, export.export_query(current_user.id), f'posts_{current_user.id}.ndjson', accept_encoding)
 
 
 @router.put('/post/{post_id}', response_model=schemas.Post, status_code=status.HTTP_200_OK)
-async def update_post(update_post: schemas.PostBase, db: AsyncSession = Depends(get_db), current_user = Depends(auth.get_current_user), db_post: models.Post = Depends(get_post_by_id)):
-    
-    if db_post.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail='Недостаточно прав для редактирования поста.'
-        )
-    
-    
-    post_update = update_post.model_dump(exclude_unset=True)
+async def update_post(post_id: int, update_post: schemas.PostBase, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
 
-    for key, value in post_update.items():
-        setattr(db_post, key, value)
+    # Проверка владельца прямо в WHERE: один запрос вместо загрузки, сравнения и refresh
+    db_post = await db.scalar(
+        update(models.Post)
+        .where(models.Post.id == post_id, models.Post.owner_id == current_user.id)
+        .values(**update_post.model_dump(exclude_unset=True))
+        .returning(models.Post)
+    )
+
+    if db_post is None:
+        raise await post_write_miss(post_id, db, 'Недостаточно прав для редактирования поста.')
 
     await db.commit()
 
-    await db.refresh(db_post)
+    await cache.invalidate_posts(redis_client, current_user.id)
+    await replicas.mark_write(redis_client, current_user.id)
 
-    return db_post
+    return post_with_owner(db_post, current_user)
 
 
 
 @router.delete('/post/{post_id}', status_code=status.HTTP_200_OK)
-async def delete_post(db: AsyncSession = Depends(get_db), current_user = Depends(auth.get_current_user), db_post: models.Post = Depends(get_post_by_id)):
-    
-    if current_user.id != db_post.owner_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail='У вас недостаточно прав на удаление этого поста!'
-        )
-    
-    await db.delete(db_post)
+async def delete_post(post_id: int, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
 
-    await db.commit()
+    owned_post = select(models.Post.id).where(models.Post.id == post_id, models.Post.owner_id == current_user.id)
 
-    return {'detail': f'Пост №{db_post.id} успешно удален!'}
+    # Лайки удаляются первыми, иначе внешний ключ не даст удалить пост; чужие посты подзапрос не пропустит
+    await db.execute(delete(models.Like).where(models.Like.post_id.in_(owned_post)))
 
+    deleted_id = await db.scalar(
+        delete(models.Post)
+        .where(models.Post.id == post_id, models.Post.owner_id == current_user.id)
+        .returning(models.Post.id)
+    )
 
-@router.post('/post/{post_id}/like')
-async def like(post_id: int, db: AsyncSession = Depends(get_db), current_user = Depends(auth.get_current_user)):
+    if deleted_id is None:
+        raise await post_write_miss(post_id, db, 'У вас недостаточно прав на удаление этого поста!')
 
-    post_db = await db.get(models.Post, post_id)
+    await db.commit()
 
-    if not post_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Нет поста"
-        )
+    await cache.invalidate_posts(redis_client, current_user.id)
+    await replicas.mark_write(redis_client, current_user.id)
+    await trending.remove_post(redis_client, deleted_id)
+    await counts.add_posts(redis_client, current_user.id, -1)
 
-    existing_like_query = select(models.Like).filter(models.Like.post_id == post_id, models.Like.user_id == current_user.id)
+    return {'detail': f'Пост №{deleted_id} успешно удален!'}
 
-    existing_like_result = await db.execute(existing_like_query)
 
-    existing_like = existing_like_result.scalar_one_or_none()
+@router.post('/post/{post_id}/like', response_model=schemas.LikeResult)
+async def like(post_id: int, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user), redis_client: redis.Redis = Depends(get_redis_client)):
 
-    if not existing_like:
-        new_like = models.Like(post_id=post_id, user_id=current_user.id)
-        db.add(new_like)
-        post_db.likes_count += 1
-        await db.commit()
-        return {'detail': 'Лайк поставлен'}
+    if settings.likes_write_behind:
+        # Кэши сбросит фоновый flusher, а чтения сами учтут отложенную разницу
+        delta, likes_count = await likes.toggle_like_buffered(db, redis_client, post_id, current_user.id)
     else:
-        await db.delete(existing_like)
-        post_db.likes_count -= 1
-        await db.commit()
-        return {'detail': 'Лайк убран'}
\ No newline at end of file
+        delta, likes_count, owner_id = await likes.toggle_like(db, post_id, current_user.id)
+
+        if delta:
+            await cache.invalidate_posts(redis_client, owner_id)
+            await replicas.mark_write(redis_client, current_user.id)
+
+    await trending.record_like(redis_client, post_id, delta, likes_count)
+
+    return {
+        'detail': 'Лайк убран' if delta < 0 else 'Лайк поставлен',
+        'likes_count': likes_count
+    }
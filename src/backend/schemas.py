@@ -33,6 +33,26 @@ class Post(PostBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class LikeResult(BaseModel):
+    detail: str
+    likes_count: int
+
+
+class FollowResult(BaseModel):
+    detail: str
+    followers_count: int
+
+
+class BulkImportError(BaseModel):
+    index: int
+    errors: list[dict]
+
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    errors: list[BulkImportError]
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -41,4 +61,5 @@ class Token(BaseModel):
 
 
 class TokenData(BaseModel):
-    username: Optional[str] = None
\ No newline at end of file
+    username: Optional[str] = None
+    user_id: Optional[int] = None
\ No newline at end of file
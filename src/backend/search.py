@@ -0,0 +1,56 @@
+import re
+from sqlalchemy import select, func, literal_column, tuple_, cast, REAL, bindparam, table, column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from . import models
+
+
+SEARCH_CONFIG = 'russian'
+
+posts_fts = table('posts_fts', column('rowid'))
+
+
+def fts5_query(q: str) -> str:
+    # Каждое слово в кавычках: пользовательский ввод не должен разбираться как синтаксис FTS5
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', q))
+
+
+async def search_posts(db: AsyncSession, q: str, limit: int, after: tuple[float, int] | None = None) -> list[tuple[models.Post, float]]:
+
+    if db.bind.dialect.name == 'postgresql':
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+        search_vector = literal_column('posts.search_vector')
+
+        rank = func.ts_rank_cd(search_vector, ts_query)
+
+        stmt = select(models.Post, rank.label('rank')).where(search_vector.op('@@')(ts_query))
+
+        after_rank = cast(bindparam('after_rank'), REAL)
+    else:
+        match = fts5_query(q)
+
+        if not match:
+            return []
+
+        # bm25 тем меньше, чем релевантнее; совпадение в заголовке весит больше
+        rank = -func.bm25(literal_column('posts_fts'), 10.0, 1.0)
+
+        stmt = (
+            select(models.Post, rank.label('rank'))
+            .join(posts_fts, posts_fts.c.rowid == models.Post.id)
+            .where(literal_column('posts_fts').op('MATCH')(match))
+        )
+
+        after_rank = bindparam('after_rank')
+
+    stmt = stmt.options(selectinload(models.Post.owner)).order_by(rank.desc(), models.Post.id.desc()).limit(limit)
+
+    params = {}
+
+    if after:
+        stmt = stmt.where(tuple_(rank, models.Post.id) < tuple_(after_rank, after[1]))
+        params['after_rank'] = after[0]
+
+    result = await db.execute(stmt, params)
+
+    return [(post, rank_value) for post, rank_value in result.all()]
@@ -1,8 +1,13 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from typing import Optional
 from datetime import datetime, timedelta, timezone
-from jose import jwt
+from jose import JWTError, jwt
 from .config import get_settings
+from .metrics import PASSWORD_HASH_PENDING, PASSWORD_HASH_SECONDS, PASSWORD_HASH_REJECTED
 
 settings = get_settings()
 
@@ -11,7 +16,20 @@ ALGORITHM = settings.algorithm
 SECRET_KEY = settings.secret_key
 TOKEN_ACCESS_EXPIRE_MINUTES = settings.token_access_expire_minutes
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# min/max совпадают с default: хэш с другой стоимостью считается устаревшим и пересчитывается при входе
+pwd_context = CryptContext(
+    schemes=['bcrypt'],
+    deprecated='auto',
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds
+)
+
+# bcrypt отпускает GIL, поэтому потоки не блокируют event loop и друг друга
+password_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix='bcrypt')
+
+_pending = 0
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -21,6 +39,40 @@ def verify_password(plain_password: str, hash_password: str) -> bool:
     return pwd_context.verify(plain_password, hash_password)
 
 
+async def _run_in_pool(operation: str, func, *args):
+
+    global _pending
+
+    if _pending >= settings.password_hash_workers + settings.password_hash_backlog:
+        PASSWORD_HASH_REJECTED.labels(operation=operation).inc()
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Сервер перегружен, попробуйте позже',
+            headers={'Retry-After': '1'}
+        )
+
+    _pending += 1
+    PASSWORD_HASH_PENDING.set(_pending)
+
+    started = time.perf_counter()
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        _pending -= 1
+        PASSWORD_HASH_PENDING.set(_pending)
+        PASSWORD_HASH_SECONDS.labels(operation=operation).observe(time.perf_counter() - started)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool('hash', pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hash_password: str) -> tuple[bool, Optional[str]]:
+    return await _run_in_pool('verify', pwd_context.verify_and_update, plain_password, hash_password)
+
+
 def create_access_token(data: dict, expire_minutes: Optional[timedelta] = None):
 
     to_encode = data.copy()
@@ -38,4 +90,17 @@ def create_access_token(data: dict, expire_minutes: Optional[timedelta] = None):
         algorithm=ALGORITHM
     )
 
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+
+def token_user_id(authorization: str | None) -> Optional[int]:
+    # Нестрогий разбор для маршрутизации чтений: без токена или с плохим токеном запрос просто анонимный
+    scheme, _, token = (authorization or '').partition(' ')
+
+    if scheme.lower() != 'bearer' or not token:
+        return None
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get('uid')
+    except JWTError:
+        return None
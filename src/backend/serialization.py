@@ -0,0 +1,65 @@
+import orjson
+from fastapi import Response
+from pydantic import TypeAdapter
+from . import models, schemas
+
+
+posts_adapter = TypeAdapter(list[schemas.Post])
+
+
+def post_row(post: models.Post) -> dict:
+    # Тот же JSON, что дает schemas.Post, но без валидации: строки из БД уже корректны.
+    # owner обязан быть загружен заранее (selectinload(models.Post.owner)): ленивая загрузка
+    # в асинхронной сессии падает, а внешний ключ гарантирует, что владелец существует
+    return {
+        'title': post.title,
+        'content': post.content,
+        'id': post.id,
+        'created_at': post.created_at,
+        'owner': {'id': post.owner.id, 'username': post.owner.username},
+        'likes_count': post.likes_count,
+    }
+
+
+def dumps_post_rows(posts: list[models.Post]) -> bytes:
+    return orjson.dumps([post_row(post) for post in posts])
+
+
+def dumps_posts(posts: list[schemas.Post]) -> bytes:
+    return orjson.dumps([post.model_dump() for post in posts])
+
+
+# Формат значений в кэше: сырые байты orjson, у страниц ленты курсор первой строкой.
+# Входит в SCHEMA_VERSION, поэтому при смене формата меняются и ключи кэша
+PAYLOAD_FORMAT = 'orjson+cursor-line/1'
+
+
+def encode_page(cursor: str | None, body: bytes) -> bytes:
+    # Курсор следующей страницы хранится первой строкой, чтобы не разбирать JSON ради последнего поста
+    return (cursor or '').encode() + b'\n' + body
+
+
+def decode_page(page: bytes) -> tuple[str | None, bytes]:
+
+    cursor, _, body = page.partition(b'\n')
+
+    return cursor.decode() or None, body
+
+
+def json_response(body: bytes, headers: dict | None = None) -> Response:
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def dumps_export_rows(rows) -> bytes:
+    # Строки выгрузки приходят колонками, без ORM-объектов: по одному JSON-объекту на строку NDJSON
+    return b''.join(
+        orjson.dumps({
+            'title': row.title,
+            'content': row.content,
+            'id': row.id,
+            'created_at': row.created_at,
+            'owner': {'id': row.owner_id, 'username': row.owner_username},
+            'likes_count': row.likes_count,
+        }) + b'\n'
+        for row in rows
+    )
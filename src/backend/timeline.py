@@ -0,0 +1,222 @@
+import logging
+import redis.asyncio as redis
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, cache
+from .likes import insert_ignore
+from .config import get_settings
+
+settings = get_settings()
+
+PREFIX = f'{cache.NAMESPACE}:timeline'
+
+# Пустая лента после перестройки все равно должна существовать, иначе ее будут перестраивать на каждом чтении.
+# Метка лежит на score 0, ниже любого id поста, и в выдачу не попадает.
+SENTINEL = '0'
+
+# Пополняются только уже собранные ленты: в отсутствующую добавился бы один пост без истории
+FANOUT_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[1])
+        redis.call('ZREMRANGEBYRANK', key, 0, -tonumber(ARGV[2]) - 1)
+    end
+end
+return #KEYS
+"""
+
+
+def timeline_key(user_id: int) -> str:
+    return f'{PREFIX}:{user_id}'
+
+
+def user_not_found():
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail='Пользователь не найден'
+    )
+
+
+def is_celebrity():
+    return models.User.followers_count >= settings.timeline_fanout_max_followers
+
+
+def followees(user_id: int, celebrities: bool | None = None):
+
+    query = select(models.Follow.followee_id).where(models.Follow.follower_id == user_id)
+
+    if celebrities is not None:
+        query = query.join(models.User, models.User.id == models.Follow.followee_id).where(is_celebrity() if celebrities else ~is_celebrity())
+
+    return query
+
+
+async def followed_post_ids(db: AsyncSession, user_id: int, limit: int, before: int | None = None, celebrities: bool | None = None) -> list[int]:
+
+    # Свои посты тоже попадают в домашнюю ленту
+    query = select(models.Post.id).where(
+        or_(models.Post.owner_id == user_id, models.Post.owner_id.in_(followees(user_id, celebrities)))
+    ).order_by(models.Post.id.desc()).limit(limit)
+
+    if before is not None:
+        query = query.where(models.Post.id < before)
+
+    return list(await db.scalars(query))
+
+
+async def rebuild_timeline(db: AsyncSession, redis_client: redis.Redis, user_id: int):
+
+    # Посты знаменитостей в ленту не раскладываются, их подмешивают при чтении
+    post_ids = await followed_post_ids(db, user_id, settings.timeline_max_length, celebrities=False)
+
+    key = timeline_key(user_id)
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.zadd(key, {SENTINEL: 0, **{str(post_id): post_id for post_id in post_ids}})
+        pipe.expire(key, settings.timeline_ttl_seconds)
+
+        await pipe.execute()
+
+
+async def read_timeline(db: AsyncSession, redis_client: redis.Redis, user_id: int, limit: int, before: int | None = None) -> list[int]:
+
+    key = timeline_key(user_id)
+
+    if not await redis_client.exists(key):
+        await rebuild_timeline(db, redis_client, user_id)
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrevrangebyscore(key, f'({before}' if before else '+inf', '(0', start=0, num=limit)
+        pipe.zcard(key)
+        pipe.expire(key, settings.timeline_ttl_seconds)
+
+        members, length, _ = await pipe.execute()
+
+    timeline_ids = [int(member) for member in members]
+
+    post_ids = set(timeline_ids)
+
+    celebrity_ids = list(await db.scalars(followees(user_id, celebrities=True)))
+
+    if celebrity_ids:
+        # fan-in: свежие посты знаменитостей читаются из БД и сливаются с лентой
+        query = select(models.Post.id).where(models.Post.owner_id.in_(celebrity_ids)).order_by(models.Post.id.desc()).limit(limit)
+
+        if before is not None:
+            query = query.where(models.Post.id < before)
+
+        post_ids.update(await db.scalars(query))
+
+    if len(timeline_ids) < limit and length >= settings.timeline_max_length:
+        # Лента обрезана: то, что глубже, дочитывается из БД. Граница берется по самой ленте,
+        # а не по слитому списку, иначе старый пост знаменитости отрезал бы посты между ними
+        oldest = min(timeline_ids, default=before)
+
+        post_ids.update(await followed_post_ids(db, user_id, limit - len(timeline_ids), before=oldest))
+
+    return sorted(post_ids, reverse=True)[:limit]
+
+
+async def fanout_keys(db: AsyncSession, author_id: int):
+
+    # Подписчики читаются, только если автор не знаменитость; у знаменитостей работает fan-in при чтении
+    followers = select(models.Follow.follower_id).where(
+        models.Follow.followee_id == author_id,
+        select(models.User.followers_count).where(models.User.id == author_id).scalar_subquery() < settings.timeline_fanout_max_followers
+    )
+
+    result = await db.stream_scalars(followers.execution_options(yield_per=settings.timeline_fanout_batch_size))
+
+    keys = [timeline_key(author_id)]
+
+    async for follower_id in result:
+        keys.append(timeline_key(follower_id))
+
+        if len(keys) >= settings.timeline_fanout_batch_size:
+            yield keys
+            keys = []
+
+    if keys:
+        yield keys
+
+
+async def fan_out(db: AsyncSession, redis_client: redis.Redis, post_id: int, author_id: int):
+
+    async for keys in fanout_keys(db, author_id):
+        await redis_client.eval(FANOUT_SCRIPT, len(keys), *keys, post_id, settings.timeline_max_length)
+
+
+async def fan_out_after_response(redis_client: redis.Redis, session_factory, post_id: int, author_id: int):
+
+    # Публикация не ждет раскладки по лентам и не падает из-за нее: без fan-out пост все равно
+    # попадет в ленты при их следующей перестройке
+    try:
+        async with session_factory() as db:
+            await fan_out(db, redis_client, post_id, author_id)
+    except Exception:
+        logging.exception(f'Не удалось разложить пост №{post_id} по лентам подписчиков')
+
+
+async def drop_follower_timelines(db: AsyncSession, redis_client: redis.Redis, author_id: int):
+
+    # После массовой вставки id постов неизвестны (COPY их не возвращает): ленты подписчиков
+    # проще собрать заново при следующем чтении, чем раскладывать в них каждую пачку
+    async for keys in fanout_keys(db, author_id):
+        await redis_client.delete(*keys)
+
+
+async def follow(db: AsyncSession, redis_client: redis.Redis, follower_id: int, followee_id: int) -> tuple[bool, int]:
+
+    try:
+        added = await db.execute(
+            insert_ignore(db, models.Follow).values(follower_id=follower_id, followee_id=followee_id).returning(models.Follow.id)
+        )
+    except IntegrityError:
+        await db.rollback()
+        raise user_not_found()
+
+    return await _apply_follow_change(db, redis_client, follower_id, followee_id, 1 if added.first() else 0)
+
+
+async def unfollow(db: AsyncSession, redis_client: redis.Redis, follower_id: int, followee_id: int) -> tuple[bool, int]:
+
+    removed = await db.execute(
+        delete(models.Follow)
+        .where(models.Follow.follower_id == follower_id, models.Follow.followee_id == followee_id)
+        .returning(models.Follow.id),
+        execution_options={'synchronize_session': False}
+    )
+
+    return await _apply_follow_change(db, redis_client, follower_id, followee_id, -1 if removed.first() else 0)
+
+
+async def _apply_follow_change(db: AsyncSession, redis_client: redis.Redis, follower_id: int, followee_id: int, delta: int) -> tuple[bool, int]:
+
+    # Заодно проверка, что пользователь существует: в SQLite внешние ключи не проверяются
+    followers_count = await db.scalar(
+        update(models.User)
+        .where(models.User.id == followee_id)
+        .values(followers_count=models.User.followers_count + delta)
+        .returning(models.User.followers_count),
+        execution_options={'synchronize_session': False}
+    )
+
+    if followers_count is None:
+        await db.rollback()
+        raise user_not_found()
+
+    await db.commit()
+
+    if delta:
+        # Состав ленты поменялся: дешевле собрать ее заново при следующем чтении, чем править по месту
+        await redis_client.delete(timeline_key(follower_id))
+
+    if delta < 0 and followers_count == settings.timeline_fanout_max_followers - 1:
+        # Автор перестал быть знаменитостью: его посты больше не подмешиваются при чтении,
+        # а в собранных лентах подписчиков их нет
+        await drop_follower_timelines(db, redis_client, followee_id)
+
+    return bool(delta), followers_count
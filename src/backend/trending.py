@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import math
+import secrets
+import time
+import redis.asyncio as redis
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, cache
+from .config import get_settings
+
+settings = get_settings()
+
+# Вклад лайка, поставленного в момент t, равен exp((t - now) / tau). В ZSET лежит логарифм суммы,
+# сдвинутый на now / tau: score = log(sum(exp(t_i / tau))). Сдвиг общий для всех постов, поэтому
+# порядок со временем не меняется и старые оценки не пересчитываются; новый лайк прибавляется
+# через log-sum-exp прямо в Redis. Перестройка из БД: python -m src.backend.trending
+KEY = f'{cache.NAMESPACE}:trending'
+REBUILD_LOCK_KEY = f'{KEY}:rebuild:lock'
+REBUILD_LOCK_LEASE_MS = 60_000
+BUILDING_TTL_SECONDS = 600
+
+# Снятие лайка вычитает вклад одного лайка "сейчас": время исходного лайка неизвестно. Чтобы старые
+# лайки не обнулились одним снятием, вычитается не больше половины оценки; пост выпадает из рейтинга,
+# только когда лайков у него не осталось (ARGV[3] == '0').
+LIKE_SCRIPT = """
+local weight = tonumber(ARGV[2])
+local current = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if ARGV[3] == '1' then
+    if not current then
+        redis.call('ZADD', KEYS[1], weight, ARGV[1])
+        return 1
+    end
+    current = tonumber(current)
+    local high, low = math.max(current, weight), math.min(current, weight)
+    redis.call('ZADD', KEYS[1], high + math.log(1 + math.exp(low - high)), ARGV[1])
+    return 1
+end
+if ARGV[3] == '0' then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return 0
+end
+if not current then
+    return 0
+end
+current = tonumber(current)
+local removed = math.min(weight, current - math.log(2))
+redis.call('ZADD', KEYS[1], current + math.log(1 - math.exp(removed - current)), ARGV[1])
+return 1
+"""
+
+
+def tau() -> float:
+    # Через период полураспада вклад лайка уменьшается вдвое
+    return settings.trending_half_life_seconds / math.log(2)
+
+
+def weight(timestamp: float) -> float:
+    return timestamp / tau()
+
+
+async def record_like(redis_client: redis.Redis, post_id: int, delta: int, likes_count: int, now: float | None = None):
+
+    if not delta:
+        return
+
+    # 1: лайк поставлен, 0: снят последний лайк, -1: снят, но лайки еще есть
+    action = 1 if delta > 0 else (-1 if likes_count > 0 else 0)
+
+    await redis_client.eval(LIKE_SCRIPT, 1, KEY, post_id, repr(weight(now or time.time())), action)
+
+
+async def remove_post(redis_client: redis.Redis, post_id: int):
+    await redis_client.zrem(KEY, post_id)
+
+
+async def trending_post_ids(redis_client: redis.Redis, limit: int, offset: int = 0) -> list[int]:
+    return [int(member) for member in await redis_client.zrevrange(KEY, offset, offset + limit - 1)]
+
+
+async def trim(redis_client: redis.Redis) -> int:
+    # Все оценки затухают одинаково, поэтому хвост по рангу и есть самые остывшие посты
+    return await redis_client.zremrangebyrank(KEY, 0, -settings.trending_max_size - 1)
+
+
+async def rebuild(db: AsyncSession, redis_client: redis.Redis, now: datetime | None = None) -> int:
+
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Время отдельных лайков не хранится: лайки поста считаются поставленными в момент публикации
+    query = (
+        select(models.Post.id, models.Post.likes_count, models.Post.created_at)
+        .where(models.Post.created_at >= now - timedelta(seconds=settings.trending_rebuild_window_seconds), models.Post.likes_count > 0)
+        .execution_options(yield_per=settings.trending_rebuild_batch_size)
+    )
+
+    building_key = f'{KEY}:building:{secrets.token_hex(4)}'
+    written = 0
+
+    try:
+        result = await db.stream(query)
+
+        async for partition in result.partitions():
+            scores = {
+                str(post_id): math.log(likes_count) + weight(created_at.replace(tzinfo=timezone.utc).timestamp())
+                for post_id, likes_count, created_at in partition
+            }
+
+            async with redis_client.pipeline(transaction=False) as pipe:
+                # Если перестройка оборвется, недособранный набор истечет сам
+                pipe.zadd(building_key, scores)
+                pipe.expire(building_key, BUILDING_TTL_SECONDS)
+
+                await pipe.execute()
+
+            written += len(scores)
+
+        if written:
+            # Готовый набор сливается с живым одной командой: чтения не видят наполовину собранный рейтинг,
+            # а лайки, записанные другими подами во время прохода по БД, не теряются. MAX, а не сумма:
+            # likes_count в БД может уже учитывать часть этих лайков
+            await redis_client.zunionstore(KEY, [building_key, KEY], aggregate='MAX')
+            await trim(redis_client)
+    finally:
+        await redis_client.delete(building_key)
+
+    return written
+
+
+async def rebuild_if_missing(redis_client: redis.Redis, session_factory) -> bool:
+
+    if await redis_client.exists(KEY):
+        return False
+
+    token = secrets.token_hex(8)
+
+    # Реплики стартуют одновременно: собирает одна
+    if not await redis_client.set(REBUILD_LOCK_KEY, token, nx=True, px=REBUILD_LOCK_LEASE_MS):
+        return False
+
+    try:
+        async with session_factory() as session:
+            written = await rebuild(session, redis_client)
+
+        logging.info(f'Рейтинг популярных постов собран из БД: {written}')
+
+        return True
+    finally:
+        await redis_client.eval(cache.RELEASE_LOCK_SCRIPT, 1, REBUILD_LOCK_KEY, token)
+
+
+async def run_trimmer(redis_client: redis.Redis):
+
+    while True:
+        await asyncio.sleep(settings.trending_trim_interval_seconds)
+
+        try:
+            await trim(redis_client)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('Не удалось обрезать рейтинг популярных постов')
+
+
+async def main():
+
+    from .database import AsyncSessionLocal
+
+    redis_client = redis.from_url(settings.redis_url)
+
+    try:
+        async with AsyncSessionLocal() as session:
+            written = await rebuild(session, redis_client)
+
+        print(f'Рейтинг популярных постов собран: {written}')
+    finally:
+        await redis_client.aclose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
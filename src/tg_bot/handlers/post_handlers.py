@@ -121,19 +121,13 @@ async def like_handler(callback: types.CallbackQuery):
                 await callback.answer(f'Произошла ошибка: {error_detail}', show_alert=True)
                 return
             
-            get_response = await client.get(f'{API_BASE_URL}/posts')
-            get_response.raise_for_status
-            posts = get_response.json()
+            like_data = response.json()
 
-            post_to_update = next((p for p in posts if p['id'] == post_id))
+            new_kb = get_inline_kb(post_id=post_id, current_likes=like_data.get('likes_count', 0))
 
-            if post_to_update:
+            await callback.message.edit_reply_markup(reply_markup=new_kb)
 
-                new_kb = get_inline_kb(post_id=post_id, current_likes=post_to_update.get('likes_count', 0))
-
-                await callback.message.edit_reply_markup(reply_markup=new_kb)
-                
-                await callback.answer(text=response.json().get('detail'), show_alert=False)
+            await callback.answer(text=like_data.get('detail'), show_alert=False)
         except httpx.RequestError:
             await callback.answer('Не удалось подключиться к серверу.', show_alert=True)
 
@@ -3,13 +3,16 @@ import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from httpx import AsyncClient, ASGITransport
+from contextlib import contextmanager
 from typing import AsyncGenerator
-from src.backend.database import Base
-from src.backend.dependencies import get_db
+from src.backend.database import Base, instrument_engine
+from src.backend.dependencies import get_db, get_sessionmaker
 from src.backend.main import app
 from src.backend import models
 from src.backend.config import get_settings, get_test_settings
 from src.backend.clients import get_redis_client
+from src.backend.cache import local_caches
+from src.backend.query_stats import capture_queries
 
 app.dependency_overrides[get_settings] = get_test_settings
 
@@ -17,6 +20,8 @@ TEST_DATABASE = 'sqlite+aiosqlite:///:memory:'
 
 test_engine = create_async_engine(TEST_DATABASE)
 
+instrument_engine(test_engine, 'tests')
+
 TestAsyncLocalSession = sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -33,6 +38,19 @@ async def override_redis_client():
 app.dependency_overrides[get_redis_client] = override_redis_client
 
 
+@pytest.fixture(autouse=True, scope='function')
+async def redis_client() -> AsyncGenerator[redis.Redis, None]:
+
+    client = await override_redis_client()
+    await client.flushdb()
+
+    for local in local_caches.values():
+        local.clear()
+
+    yield client
+    await client.aclose()
+
+
 @pytest.fixture(autouse=True, scope='function')
 async def prepare_database():
     async with test_engine.begin() as conn:
@@ -50,12 +68,32 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
             yield session
     
     app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_sessionmaker] = lambda: TestAsyncLocalSession
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url='http://test') as ac:
         yield ac
 
 
+@pytest.fixture(scope='function')
+def query_budget():
+
+    @contextmanager
+    def budget(expected: int):
+
+        with capture_queries() as stats:
+            yield stats
+
+        assert stats.count == expected, f'Ожидалось SQL-запросов: {expected}, выполнено: {stats.count}\n{dict(stats.shapes)}'
+
+    return budget
+
+
+@pytest.fixture(scope='function')
+def session_factory():
+    return TestAsyncLocalSession
+
+
 @pytest.fixture(scope='function')
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     async with TestAsyncLocalSession() as session:
@@ -1,7 +1,9 @@
 import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.backend import models
+from jose import jwt
+from passlib.hash import bcrypt
+from src.backend import models, security, cache
 
 
 @pytest.mark.anyio
@@ -86,4 +88,77 @@ async def test_not_successful_password(client: AsyncClient, test_user: models.Us
     response = await client.post('/token', data=data)
 
     assert response.status_code == 401
-    assert response.json()['detail'] == 'Неправильный ник или пароль'
\ No newline at end of file
+    assert response.json()['detail'] == 'Неправильный ник или пароль'
+
+
+@pytest.mark.anyio
+async def test_token_carries_user_id(client: AsyncClient, test_user: models.User):
+
+    response = await client.post('/token', data={'username': test_user.username, 'password': 'testpassword'})
+
+    payload = jwt.decode(response.json()['access_token'], security.SECRET_KEY, algorithms=[security.ALGORITHM])
+
+    assert payload['uid'] == test_user.id
+    assert payload['sub'] == test_user.username
+
+
+
+@pytest.mark.anyio
+async def test_current_user_is_cached(authenticated_client: AsyncClient, test_user: models.User, redis_client):
+
+    response = await authenticated_client.get('/user/posts')
+
+    assert response.status_code == 404
+
+    cached_user = cache.local_users_cache.get(str(test_user.id))
+
+    assert cached_user.username == test_user.username
+
+    await cache.invalidate_user(redis_client, test_user.id)
+
+    assert cache.local_users_cache.get(str(test_user.id)) is None
+
+
+
+@pytest.mark.anyio
+async def test_token_without_user_id(client: AsyncClient, test_user: models.User):
+
+    access_token = security.create_access_token(data={'sub': test_user.username})
+
+    client.headers['Authorization'] = f'Bearer {access_token}'
+
+    response = await client.get('/user/posts')
+
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'У вас пока нет постов'
+
+
+
+@pytest.mark.anyio
+async def test_login_rehashes_outdated_password(client: AsyncClient, db_session: AsyncSession):
+
+    user = models.User(username='old_hash', password_hash=bcrypt.using(rounds=4).hash('old_password'))
+
+    db_session.add(user)
+    await db_session.commit()
+
+    response = await client.post('/token', data={'username': 'old_hash', 'password': 'old_password'})
+
+    assert response.status_code == 200
+
+    await db_session.refresh(user)
+
+    assert bcrypt.from_string(user.password_hash).rounds == security.settings.bcrypt_rounds
+    assert security.verify_password('old_password', user.password_hash)
+
+
+
+@pytest.mark.anyio
+async def test_login_rejected_when_hash_pool_is_full(client: AsyncClient, test_user: models.User, monkeypatch):
+
+    monkeypatch.setattr(security, '_pending', security.settings.password_hash_workers + security.settings.password_hash_backlog)
+
+    response = await client.post('/token', data={'username': test_user.username, 'password': 'testpassword'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
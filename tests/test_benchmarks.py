@@ -0,0 +1,56 @@
+import argparse
+import random
+import httpx
+import pytest
+from benchmarks.endpoints import compare, scenarios, summarize
+
+
+@pytest.mark.anyio
+async def test_benchmark_summary_percentiles():
+
+    result = summarize([i / 1000 for i in range(1, 101)], wall_seconds=2.0, errors=0)
+
+    assert result['rps'] == 50.0
+    assert result['p50_ms'] == pytest.approx(51, abs=1)
+    assert result['p95_ms'] == pytest.approx(95, abs=1)
+    assert result['p99_ms'] == pytest.approx(99, abs=1)
+
+
+
+@pytest.mark.anyio
+async def test_benchmark_regression_gate():
+
+    baseline = {'scenarios': {'GET /posts': {'rps': 1000.0, 'p95_ms': 10.0, 'errors': 0}}}
+
+    within = {'scenarios': {'GET /posts': {'rps': 900.0, 'p95_ms': 11.5, 'errors': 0}, 'GET /new': {'rps': 1.0, 'p95_ms': 1.0, 'errors': 0}}}
+    slower = {'scenarios': {'GET /posts': {'rps': 700.0, 'p95_ms': 13.0, 'errors': 1}}}
+
+    assert compare(within, baseline, threshold=0.2) == []
+    assert len(compare(slower, baseline, threshold=0.2)) == 3
+
+
+
+@pytest.mark.anyio
+async def test_seed_like_counts_are_skewed_and_deterministic():
+
+    import random
+    from benchmarks.seed import like_counts
+
+    counts = like_counts(range(1, 1001), total=10_000, max_per_post=500, s=1.1, rng=random.Random(42))
+
+    assert counts == like_counts(range(1, 1001), total=10_000, max_per_post=500, s=1.1, rng=random.Random(42))
+    assert max(counts.values()) == 500
+    # Длинный хвост: половина постов почти без лайков
+    assert sorted(counts.values())[500] <= 5
+
+
+@pytest.mark.anyio
+async def test_cursor_scenario_without_second_page():
+
+    class Client:
+        async def get(self, url, params=None):
+            return httpx.Response(200, json=[])
+
+    call, _ = scenarios(argparse.Namespace(requests=1, token_requests=1), {'post_ids': [1]}, random.Random(0))['GET /posts?cursor']
+
+    assert (await call(Client(), 0)).status_code == 200
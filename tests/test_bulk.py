@@ -0,0 +1,72 @@
+import orjson
+import pytest
+from httpx import AsyncClient
+from src.backend import bulk
+
+
+@pytest.mark.anyio
+async def test_bulk_import_json_array(authenticated_client: AsyncClient):
+
+    # Лента закэширована до импорта и должна обновиться после него
+    assert (await authenticated_client.get('/posts')).json() == []
+
+    response = await authenticated_client.post('/posts/bulk', json=[
+        {'title': 'Первый', 'content': 'Текст'},
+        {'title': 'Без текста'},
+        {'title': 'Второй', 'content': 'Текст'},
+    ])
+
+    assert response.status_code == 200
+
+    result = response.json()
+
+    assert result['inserted'] == 2
+    assert [error['index'] for error in result['errors']] == [1]
+    assert result['errors'][0]['errors'][0]['loc'] == ['content']
+
+    posts = (await authenticated_client.get('/posts')).json()
+
+    assert sorted(post['title'] for post in posts) == ['Второй', 'Первый']
+    assert all(post['owner']['username'] == 'testuser' for post in posts)
+
+
+
+@pytest.mark.anyio
+async def test_bulk_import_ndjson_in_chunks(authenticated_client: AsyncClient, monkeypatch):
+
+    monkeypatch.setattr(bulk.settings, 'bulk_import_chunk_size', 2)
+
+    invalidations = []
+    invalidate_posts = bulk.cache.invalidate_posts
+
+    async def counting_invalidate(*args):
+        invalidations.append(args)
+        await invalidate_posts(*args)
+
+    monkeypatch.setattr(bulk.cache, 'invalidate_posts', counting_invalidate)
+
+    lines = [orjson.dumps({'title': f'Пост {i}', 'content': 'Текст'}) for i in range(5)]
+    lines.insert(2, b'{not json')
+
+    response = await authenticated_client.post(
+        '/posts/bulk',
+        content=b'\n'.join(lines) + b'\n',
+        headers={'Content-Type': 'application/x-ndjson'}
+    )
+
+    assert response.json()['inserted'] == 5
+    assert response.json()['errors'][0]['index'] == 2
+    assert len(invalidations) == 3
+
+    search = await authenticated_client.get('/posts/search', params={'q': 'Пост'})
+
+    assert len(search.json()) == 5
+
+
+
+@pytest.mark.anyio
+async def test_bulk_import_rejects_non_array(authenticated_client: AsyncClient):
+
+    response = await authenticated_client.post('/posts/bulk', json={'title': 'Пост', 'content': 'Текст'})
+
+    assert response.status_code == 400
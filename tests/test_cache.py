@@ -0,0 +1,202 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from src.backend import models, cache
+from src.backend.local_cache import LocalCache
+
+
+def cache_requests(cache: str, result: str, tier: str = 'redis') -> float:
+    return REGISTRY.get_sample_value('blog_cache_requests_total', {'cache': cache, 'tier': tier, 'result': result}) or 0.0
+
+
+@pytest.mark.anyio
+async def test_feed_cache_hit(client: AsyncClient, test_user: models.User, db_session):
+
+    db_session.add(models.Post(title='Пост', content='Текст', owner_id=test_user.id))
+    await db_session.commit()
+
+    redis_hits_before = cache_requests('feed', 'hit')
+    local_hits_before = cache_requests('feed', 'hit', tier='local')
+
+    first = await client.get('/posts')
+    second = await client.get('/posts')
+
+    assert first.json() == second.json()
+    assert cache_requests('feed', 'hit', tier='local') == local_hits_before + 1
+
+    cache.local_posts_cache.clear()
+
+    third = await client.get('/posts')
+
+    assert third.json() == first.json()
+    assert cache_requests('feed', 'hit') == redis_hits_before + 1
+
+
+
+@pytest.mark.anyio
+async def test_feed_cache_invalidated_on_write(authenticated_client: AsyncClient):
+
+    await authenticated_client.post('/posts', json={'title': 'Первый', 'content': 'Текст'})
+
+    response = await authenticated_client.get('/posts')
+    assert len(response.json()) == 1
+
+    new_post = await authenticated_client.post('/posts', json={'title': 'Второй', 'content': 'Текст'})
+
+    response = await authenticated_client.get('/posts')
+    assert [post['title'] for post in response.json()] == ['Второй', 'Первый']
+
+    await authenticated_client.post(f'/post/{new_post.json()["id"]}/like')
+
+    response = await authenticated_client.get('/posts')
+    assert response.json()[0]['likes_count'] == 1
+
+    await authenticated_client.delete(f'/post/{new_post.json()["id"]}')
+
+    response = await authenticated_client.get('/posts')
+    assert [post['title'] for post in response.json()] == ['Первый']
+
+
+
+@pytest.mark.anyio
+async def test_user_posts_cache_invalidated_on_write(authenticated_client: AsyncClient):
+
+    created = await authenticated_client.post('/posts', json={'title': 'Первый', 'content': 'Текст'})
+
+    response = await authenticated_client.get('/user/posts')
+    assert [post['title'] for post in response.json()] == ['Первый']
+
+    post_id = created.json()['id']
+
+    await authenticated_client.put(f'/post/{post_id}', json={'title': 'Исправленный', 'content': 'Текст'})
+
+    response = await authenticated_client.get('/user/posts')
+    assert [post['title'] for post in response.json()] == ['Исправленный']
+
+    await authenticated_client.post(f'/post/{post_id}/like')
+
+    response = await authenticated_client.get('/user/posts')
+    assert response.json()[0]['likes_count'] == 1
+
+    await authenticated_client.delete(f'/post/{post_id}')
+
+    response = await authenticated_client.get('/user/posts')
+    assert response.status_code == 404
+
+
+
+@pytest.mark.anyio
+async def test_local_cache_bounds():
+
+    local = LocalCache('test', max_entries=2, max_bytes=10, ttl=60)
+
+    local.set('a', 1, size=4)
+    local.set('b', 2, size=4)
+    local.get('a')
+    local.set('c', 3, size=4)
+
+    assert local.get('b') is None
+    assert local.get('a') == 1
+    assert local.size_bytes <= 10
+
+    local.set('big', 4, size=11)
+
+    assert local.get('big') is None
+
+    local.set('short', 5, size=1, ttl=0)
+
+    assert local.get('short') is None
+
+
+
+@pytest.mark.anyio
+async def test_invalidation_is_broadcast(redis_client):
+
+    listener = asyncio.create_task(cache.listen_invalidations(redis_client))
+    await asyncio.sleep(0.1)
+
+    cache.local_posts_cache.set('user_posts:1', [], size=2)
+    cache.local_posts_cache.set('feed:100:0', [], size=2)
+
+    await redis_client.publish(cache.INVALIDATION_CHANNEL, 'posts|feed:*')
+    await asyncio.sleep(0.1)
+
+    listener.cancel()
+
+    assert cache.local_posts_cache.get('feed:100:0') is None
+    assert cache.local_posts_cache.get('user_posts:1') == []
+
+
+
+@pytest.mark.anyio
+async def test_cached_bytes_are_served_as_is(authenticated_client: AsyncClient, test_user: models.User, redis_client):
+
+    await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+
+    first = await authenticated_client.get('/user/posts')
+
+    generation = await cache.get_generation(redis_client, cache.user_posts_generation_key(test_user.id))
+    stored = await redis_client.get(cache.user_posts_key(test_user.id, generation))
+
+    cache.local_posts_cache.clear()
+
+    second = await authenticated_client.get('/user/posts')
+
+    assert second.headers['content-type'] == 'application/json'
+    assert second.content == stored == first.content
+
+
+
+@pytest.mark.anyio
+async def test_feed_conditional_get(authenticated_client: AsyncClient):
+
+    await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+
+    first = await authenticated_client.get('/posts')
+
+    etag = first.headers['etag']
+
+    assert first.headers['cache-control'] == 'public, no-cache'
+
+    local_before = cache_requests('feed', 'hit', tier='local') + cache_requests('feed', 'miss', tier='local')
+
+    second = await authenticated_client.get('/posts', headers={'If-None-Match': etag})
+
+    assert second.status_code == 304
+    assert second.content == b''
+    assert second.headers['etag'] == etag
+    # До кэша страниц и БД запрос не дошел
+    assert cache_requests('feed', 'hit', tier='local') + cache_requests('feed', 'miss', tier='local') == local_before
+
+    assert (await authenticated_client.get('/posts?limit=10', headers={'If-None-Match': etag})).status_code == 200
+
+    await authenticated_client.post('/posts', json={'title': 'Новый', 'content': 'Текст'})
+
+    third = await authenticated_client.get('/posts', headers={'If-None-Match': etag})
+
+    assert third.status_code == 200
+    assert third.headers['etag'] != etag
+    assert len(third.json()) == 2
+
+
+
+@pytest.mark.anyio
+async def test_user_posts_conditional_get(authenticated_client: AsyncClient):
+
+    created = await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+
+    first = await authenticated_client.get('/user/posts')
+
+    assert first.headers['cache-control'] == 'private, no-cache'
+
+    response = await authenticated_client.get('/user/posts', headers={'If-None-Match': f'W/{first.headers["etag"]}, "other"'})
+
+    assert response.status_code == 304
+
+    await authenticated_client.post(f'/post/{created.json()["id"]}/like')
+
+    response = await authenticated_client.get('/user/posts', headers={'If-None-Match': first.headers['etag']})
+
+    assert response.status_code == 200
+    assert response.json()[0]['likes_count'] == 1
@@ -0,0 +1,102 @@
+import pytest
+import redis.asyncio as redis
+from httpx import AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models, counts, database, replicas
+
+
+async def create_posts(client: AsyncClient, count: int) -> list[int]:
+    return [(await client.post('/posts', json={'title': f'Пост {i}', 'content': 'Текст'})).json()['id'] for i in range(count)]
+
+
+@pytest.mark.anyio
+async def test_total_count_headers(authenticated_client: AsyncClient, redis_client: redis.Redis, db_session: AsyncSession, test_user: models.User, session_factory):
+
+    other = models.User(username='other', password_hash='x')
+
+    db_session.add(other)
+    await db_session.flush()
+
+    await db_session.execute(insert(models.Post.__table__), [
+        {'title': f'Чужой {i}', 'content': 'Текст', 'owner_id': other.id} for i in range(3)
+    ])
+    await db_session.commit()
+
+    post_ids = await create_posts(authenticated_client, 2)
+
+    # Общего счетчика еще нет: без статистики планировщика он заводится с нуля, без count(*) в запросе
+    assert (await authenticated_client.get('/posts')).headers['X-Total-Count'] == '0'
+
+    assert await counts.reconcile(redis_client, session_factory)
+
+    assert (await authenticated_client.get('/posts')).headers['X-Total-Count'] == '5'
+
+    # Счетчик пользователя считается по индексу owner_id при первом чтении
+    assert (await authenticated_client.get('/user/posts')).headers['X-Total-Count'] == '2'
+
+    await create_posts(authenticated_client, 1)
+    await authenticated_client.delete(f'/post/{post_ids[0]}')
+    await authenticated_client.post('/posts/bulk', json=[{'title': f'Импорт {i}', 'content': 'Текст'} for i in range(3)])
+
+    assert await redis_client.get(counts.TOTAL_KEY) == b'8'
+    assert await redis_client.hget(counts.USER_POSTS_KEY, test_user.id) == b'5'
+
+    response = await authenticated_client.get('/posts', params={'limit': 2})
+
+    assert response.headers['X-Total-Count'] == '8'
+    assert (await authenticated_client.get('/posts', params={'limit': 2, 'cursor': response.headers['X-Next-Cursor']})).headers['X-Total-Count'] == '8'
+    assert (await authenticated_client.get('/user/posts')).headers['X-Total-Count'] == '5'
+
+
+@pytest.mark.anyio
+async def test_reconcile_fixes_drift(authenticated_client: AsyncClient, redis_client: redis.Redis, test_user: models.User, session_factory):
+
+    await create_posts(authenticated_client, 3)
+
+    await authenticated_client.get('/posts')
+    await authenticated_client.get('/user/posts')
+
+    await redis_client.set(counts.TOTAL_KEY, 100)
+    await redis_client.hset(counts.USER_POSTS_KEY, mapping={test_user.id: 7, 999: 4})
+
+    assert await counts.reconcile(redis_client, session_factory)
+
+    assert await redis_client.get(counts.TOTAL_KEY) == b'3'
+    assert await redis_client.hgetall(counts.USER_POSTS_KEY) == {str(test_user.id).encode(): b'3', b'999': b'0'}
+
+    # Вторая реплика не сверяет одновременно с первой
+    await redis_client.set(counts.RECONCILE_LOCK_KEY, 'other')
+
+    assert not await counts.reconcile(redis_client, session_factory)
+
+
+@pytest.mark.anyio
+async def test_reconcile_keeps_writes_made_during_count(redis_client: redis.Redis):
+
+    await redis_client.set(counts.TOTAL_KEY, 12)
+
+    # Снимок до подсчета был 10, точный подсчет дал 9, за это время добавились два поста
+    assert await redis_client.eval(counts.RECONCILE_TOTAL_SCRIPT, 1, counts.TOTAL_KEY, 10, 9) == 11
+
+    await redis_client.delete(counts.TOTAL_KEY)
+
+    # Пока счетчика нет, изменения его не заводят
+    await counts.add_posts(redis_client, 1, 1)
+
+    assert not await redis_client.exists(counts.TOTAL_KEY, counts.USER_POSTS_KEY)
+
+
+@pytest.mark.anyio
+async def test_reconcile_prefers_replica(monkeypatch):
+
+    primary, replica = object(), object()
+
+    monkeypatch.setattr(replicas, '_down_until', {})
+    monkeypatch.setattr(database, 'ReplicaSessionLocals', [])
+
+    assert counts.reconcile_sessionmaker(primary) is primary
+
+    monkeypatch.setattr(database, 'ReplicaSessionLocals', [replica])
+
+    assert counts.reconcile_sessionmaker(primary) is replica
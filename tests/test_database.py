@@ -0,0 +1,45 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.backend.database import InstrumentedQueuePool, instrument_engine, engine_options
+
+
+def sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.anyio
+async def test_pool_and_query_metrics(tmp_path):
+
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "pool.db"}', poolclass=InstrumentedQueuePool, pool_size=2, max_overflow=1)
+
+    instrument_engine(engine, 'test')
+
+    checkouts_before = sample('blog_db_pool_checkout_seconds_count', {'engine': 'test'})
+    selects_before = sample('blog_db_query_seconds_count', {'engine': 'test', 'operation': 'select'})
+
+    async with engine.connect() as conn:
+        await conn.execute(text('SELECT 1'))
+
+        assert sample('blog_db_pool_checked_out', {'engine': 'test'}) == 1
+
+    assert sample('blog_db_pool_checked_out', {'engine': 'test'}) == 0
+    assert sample('blog_db_pool_size', {'engine': 'test'}) == 2
+    assert sample('blog_db_pool_checkout_seconds_count', {'engine': 'test'}) == checkouts_before + 1
+    assert sample('blog_db_query_seconds_count', {'engine': 'test', 'operation': 'select'}) == selects_before + 1
+
+    await engine.dispose()
+
+
+
+@pytest.mark.anyio
+async def test_engine_options_from_settings():
+
+    options = engine_options('postgresql+asyncpg://user:pass@db/blog')
+
+    assert options['echo'] is False
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert options['connect_args']['statement_cache_size'] == 100
+
+    assert engine_options('sqlite+aiosqlite:///:memory:') == {'echo': False}
@@ -0,0 +1,59 @@
+import gzip
+import orjson
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models, export
+
+
+@pytest.mark.anyio
+async def test_export_streams_all_posts(client: AsyncClient, test_user: models.User, db_session: AsyncSession, monkeypatch):
+
+    monkeypatch.setattr(export.settings, 'export_batch_size', 2)
+
+    db_session.add_all([models.Post(title=f'Пост {i}', content='Текст', owner_id=test_user.id) for i in range(5)])
+    await db_session.commit()
+
+    response = await client.get('/posts/export', headers={'Accept-Encoding': 'identity'})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert 'content-encoding' not in response.headers
+
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+
+    assert [line['title'] for line in lines] == [f'Пост {i}' for i in range(5)]
+    assert lines == sorted((await client.get('/posts')).json(), key=lambda post: post['id'])
+
+
+
+@pytest.mark.anyio
+async def test_export_gzip(client: AsyncClient, test_user: models.User, db_session: AsyncSession):
+
+    db_session.add(models.Post(title='Пост', content='Текст', owner_id=test_user.id))
+    await db_session.commit()
+
+    async with client.stream('GET', '/posts/export', headers={'Accept-Encoding': 'gzip'}) as response:
+        raw = b''.join([chunk async for chunk in response.aiter_raw()])
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert orjson.loads(gzip.decompress(raw))['title'] == 'Пост'
+
+
+
+@pytest.mark.anyio
+async def test_user_export_only_own_posts(authenticated_client: AsyncClient, test_user: models.User, db_session: AsyncSession):
+
+    other = models.User(username='other', password_hash='x')
+    db_session.add(other)
+    await db_session.commit()
+
+    db_session.add_all([
+        models.Post(title='Мой', content='Текст', owner_id=test_user.id),
+        models.Post(title='Чужой', content='Текст', owner_id=other.id),
+    ])
+    await db_session.commit()
+
+    response = await authenticated_client.get('/user/posts/export')
+
+    assert [orjson.loads(line)['title'] for line in response.content.splitlines()] == ['Мой']
@@ -0,0 +1,237 @@
+import logging
+import pytest
+import redis.asyncio as redis
+from httpx import AsyncClient
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models, security, timeline
+
+
+@pytest.fixture
+async def author(db_session: AsyncSession) -> models.User:
+
+    user = models.User(username='author', password_hash='x')
+
+    db_session.add(user)
+    await db_session.commit()
+
+    return user
+
+
+def auth_headers(user: models.User) -> dict:
+    return {'Authorization': f'Bearer {security.create_access_token(data={"sub": user.username})}'}
+
+
+async def feed_ids(client: AsyncClient, **params) -> list[int]:
+
+    response = await client.get('/feed', params=params)
+
+    assert response.status_code == 200
+
+    return [post['id'] for post in response.json()]
+
+
+@pytest.mark.anyio
+async def test_follow_and_unfollow_update_counter(authenticated_client: AsyncClient, author: models.User):
+
+    response = await authenticated_client.post(f'/user/{author.id}/follow')
+    assert response.json() == {'detail': 'Подписка оформлена', 'followers_count': 1}
+
+    response = await authenticated_client.post(f'/user/{author.id}/follow')
+    assert response.json() == {'detail': 'Вы уже подписаны', 'followers_count': 1}
+
+    response = await authenticated_client.delete(f'/user/{author.id}/follow')
+    assert response.json() == {'detail': 'Подписка отменена', 'followers_count': 0}
+
+    response = await authenticated_client.delete(f'/user/{author.id}/follow')
+    assert response.json() == {'detail': 'Вы не были подписаны', 'followers_count': 0}
+
+
+@pytest.mark.anyio
+async def test_follow_errors(authenticated_client: AsyncClient, test_user: models.User):
+
+    response = await authenticated_client.post(f'/user/{test_user.id}/follow')
+    assert response.status_code == 400
+
+    response = await authenticated_client.post('/user/999/follow')
+    assert response.status_code == 404
+
+    response = await authenticated_client.delete('/user/999/follow')
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_feed_fan_out_on_write(authenticated_client: AsyncClient, author: models.User, test_user: models.User, redis_client: redis.Redis):
+
+    own = await authenticated_client.post('/posts', json={'title': 'Свой', 'content': 'Текст'})
+    before_follow = await authenticated_client.post('/posts', json={'title': 'Чужой', 'content': 'Текст'}, headers=auth_headers(author))
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+
+    # Первое чтение собирает ленту из БД, дальше она пополняется при публикации
+    assert await feed_ids(authenticated_client) == [before_follow.json()['id'], own.json()['id']]
+    assert await redis_client.exists(timeline.timeline_key(test_user.id))
+
+    created = await authenticated_client.post('/posts', json={'title': 'Новый', 'content': 'Текст'}, headers=auth_headers(author))
+
+    assert await redis_client.zscore(timeline.timeline_key(test_user.id), created.json()['id']) == created.json()['id']
+
+    response = await authenticated_client.get('/feed')
+    assert [post['title'] for post in response.json()] == ['Новый', 'Чужой', 'Свой']
+    assert response.json()[0]['owner']['username'] == 'author'
+
+    # Удаленный пост остается в ленте Redis, но в выдачу не попадает
+    await authenticated_client.delete(f'/post/{created.json()["id"]}', headers=auth_headers(author))
+
+    assert await feed_ids(authenticated_client) == [before_follow.json()['id'], own.json()['id']]
+
+    # Отписка сбрасывает ленту, после перестройки постов автора в ней нет
+    await authenticated_client.delete(f'/user/{author.id}/follow')
+
+    assert not await redis_client.exists(timeline.timeline_key(test_user.id))
+    assert await feed_ids(authenticated_client) == [own.json()['id']]
+
+
+@pytest.mark.anyio
+async def test_fan_out_skips_cold_timelines(authenticated_client: AsyncClient, author: models.User, test_user: models.User, redis_client: redis.Redis):
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+    await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'}, headers=auth_headers(author))
+
+    assert not await redis_client.exists(timeline.timeline_key(test_user.id))
+
+    # Пустая лента тоже сохраняется, чтобы не перестраиваться на каждом чтении
+    await authenticated_client.delete(f'/user/{author.id}/follow')
+
+    assert await feed_ids(authenticated_client) == []
+    assert await redis_client.zrange(timeline.timeline_key(test_user.id), 0, -1) == [timeline.SENTINEL.encode()]
+
+
+@pytest.mark.anyio
+async def test_celebrity_posts_are_merged_on_read(authenticated_client: AsyncClient, author: models.User, test_user: models.User, redis_client: redis.Redis, monkeypatch):
+
+    monkeypatch.setattr(timeline.settings, 'timeline_fanout_max_followers', 1)
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+
+    own = await authenticated_client.post('/posts', json={'title': 'Свой', 'content': 'Текст'})
+
+    await feed_ids(authenticated_client)
+
+    created = await authenticated_client.post('/posts', json={'title': 'Звезда', 'content': 'Текст'}, headers=auth_headers(author))
+
+    # Знаменитость не раскладывает посты по лентам подписчиков
+    assert await redis_client.zscore(timeline.timeline_key(test_user.id), created.json()['id']) is None
+    assert await feed_ids(authenticated_client) == [created.json()['id'], own.json()['id']]
+
+
+@pytest.mark.anyio
+async def test_feed_cursor_and_trimmed_timeline(authenticated_client: AsyncClient, author: models.User, db_session: AsyncSession, monkeypatch):
+
+    monkeypatch.setattr(timeline.settings, 'timeline_max_length', 5)
+
+    await db_session.execute(insert(models.Post.__table__), [
+        {'title': f'Пост {i}', 'content': 'Текст', 'owner_id': author.id} for i in range(12)
+    ])
+    await db_session.commit()
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+
+    expected = sorted(await db_session.scalars(select(models.Post.id)), reverse=True)
+
+    first = await authenticated_client.get('/feed', params={'limit': 4})
+    second = await authenticated_client.get('/feed', params={'limit': 4, 'cursor': first.headers['X-Next-Cursor']})
+    third = await authenticated_client.get('/feed', params={'limit': 10, 'cursor': second.headers['X-Next-Cursor']})
+
+    # Глубже обрезанной ленты посты дочитываются из БД
+    pages = [post['id'] for response in (first, second, third) for post in response.json()]
+
+    assert pages == expected
+    assert 'X-Next-Cursor' not in third.headers
+
+
+@pytest.mark.anyio
+async def test_trimmed_timeline_keeps_posts_older_than_celebrity_merge(authenticated_client: AsyncClient, author: models.User, db_session: AsyncSession, monkeypatch):
+
+    monkeypatch.setattr(timeline.settings, 'timeline_max_length', 5)
+    monkeypatch.setattr(timeline.settings, 'timeline_fanout_max_followers', 2)
+
+    celebrity = models.User(username='celebrity', password_hash='x', followers_count=1)
+
+    db_session.add(celebrity)
+    await db_session.flush()
+
+    # Пост знаменитости старше всех постов обычного автора
+    await db_session.execute(insert(models.Post.__table__), [
+        {'title': 'Звезда', 'content': 'Текст', 'owner_id': celebrity.id},
+        *({'title': f'Пост {i}', 'content': 'Текст', 'owner_id': author.id} for i in range(10)),
+    ])
+    await db_session.commit()
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+    await authenticated_client.post(f'/user/{celebrity.id}/follow')
+
+    expected = sorted(await db_session.scalars(select(models.Post.id)), reverse=True)
+
+    first = await authenticated_client.get('/feed', params={'limit': 10})
+    second = await authenticated_client.get('/feed', params={'limit': 10, 'cursor': first.headers['X-Next-Cursor']})
+
+    assert [post['id'] for post in first.json() + second.json()] == expected
+    assert 'X-Next-Cursor' not in second.headers
+
+
+@pytest.mark.anyio
+async def test_bulk_import_reaches_follower_timelines(authenticated_client: AsyncClient, author: models.User, test_user: models.User, redis_client: redis.Redis):
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+
+    assert await feed_ids(authenticated_client) == []
+
+    await authenticated_client.post('/posts/bulk', json=[{'title': f'Импорт {i}', 'content': 'Текст'} for i in range(3)], headers=auth_headers(author))
+
+    # Собранная лента подписчика сброшена и при чтении перестраивается уже с импортированными постами
+    assert not await redis_client.exists(timeline.timeline_key(test_user.id))
+
+    response = await authenticated_client.get('/feed')
+
+    assert [post['title'] for post in response.json()] == ['Импорт 2', 'Импорт 1', 'Импорт 0']
+
+
+@pytest.mark.anyio
+async def test_fan_out_failure_does_not_fail_publish(authenticated_client: AsyncClient, monkeypatch, caplog):
+
+    async def broken_fan_out(*args):
+        raise ConnectionError('Redis недоступен')
+
+    monkeypatch.setattr(timeline, 'fan_out', broken_fan_out)
+
+    with caplog.at_level(logging.ERROR):
+        response = await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+
+    assert response.status_code == 201
+    assert f'Не удалось разложить пост №{response.json()["id"]}' in caplog.text
+
+
+@pytest.mark.anyio
+async def test_timelines_rebuilt_when_author_stops_being_celebrity(authenticated_client: AsyncClient, author: models.User, test_user: models.User, db_session: AsyncSession, redis_client: redis.Redis, monkeypatch):
+
+    monkeypatch.setattr(timeline.settings, 'timeline_fanout_max_followers', 2)
+
+    other = models.User(username='other', password_hash='x')
+
+    db_session.add(other)
+    await db_session.commit()
+
+    await authenticated_client.post(f'/user/{author.id}/follow')
+    await timeline.follow(db_session, redis_client, other.id, author.id)
+
+    created = await authenticated_client.post('/posts', json={'title': 'Звезда', 'content': 'Текст'}, headers=auth_headers(author))
+
+    # Лента собрана без постов знаменитости, они подмешиваются при чтении
+    assert await feed_ids(authenticated_client) == [created.json()['id']]
+    assert await redis_client.zscore(timeline.timeline_key(test_user.id), created.json()['id']) is None
+
+    await timeline.unfollow(db_session, redis_client, other.id, author.id)
+
+    assert not await redis_client.exists(timeline.timeline_key(test_user.id))
+    assert await feed_ids(authenticated_client) == [created.json()['id']]
@@ -0,0 +1,183 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models, likes
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    monkeypatch.setattr(likes.settings, 'likes_write_behind', True)
+
+
+async def db_likes(db_session: AsyncSession, post_id: int) -> tuple[int, int]:
+
+    likes_count = await db_session.scalar(select(models.Post.likes_count).where(models.Post.id == post_id))
+    rows = await db_session.scalar(select(func.count()).select_from(models.Like).where(models.Like.post_id == post_id))
+
+    return likes_count, rows
+
+
+@pytest.mark.anyio
+async def test_buffered_like_is_visible_before_flush(write_behind, authenticated_client: AsyncClient, db_session: AsyncSession, test_user: models.User):
+
+    post = models.Post(title='Пост', content='Текст', owner_id=test_user.id)
+    db_session.add(post)
+    await db_session.commit()
+
+    response = await authenticated_client.post(f'/post/{post.id}/like')
+
+    assert response.json() == {'detail': 'Лайк поставлен', 'likes_count': 1}
+    assert await db_likes(db_session, post.id) == (0, 0)
+
+    response = await authenticated_client.get('/posts')
+    assert response.json()[0]['likes_count'] == 1
+
+    response = await authenticated_client.get('/user/posts')
+    assert response.json()[0]['likes_count'] == 1
+
+
+
+@pytest.mark.anyio
+async def test_flush_applies_pending_likes(write_behind, authenticated_client: AsyncClient, db_session: AsyncSession, test_user: models.User, redis_client, session_factory):
+
+    liked = models.Post(title='Лайк', content='Текст', owner_id=test_user.id)
+    toggled = models.Post(title='Туда-обратно', content='Текст', owner_id=test_user.id)
+    db_session.add_all([liked, toggled])
+    await db_session.commit()
+
+    await authenticated_client.post(f'/post/{liked.id}/like')
+    await authenticated_client.post(f'/post/{toggled.id}/like')
+    await authenticated_client.post(f'/post/{toggled.id}/like')
+
+    assert await likes.flush_pending_likes(redis_client, session_factory) == 2
+
+    assert await db_likes(db_session, liked.id) == (1, 1)
+    assert await db_likes(db_session, toggled.id) == (0, 0)
+    assert not await redis_client.exists(likes.DIRTY_KEY, likes.FLUSHING_KEY, likes.DELTA_KEY, likes.FLUSHING_DELTA_KEY)
+
+    response = await authenticated_client.get('/posts')
+    assert {post['id']: post['likes_count'] for post in response.json()} == {liked.id: 1, toggled.id: 0}
+
+    response = await authenticated_client.post(f'/post/{liked.id}/like')
+    assert response.json() == {'detail': 'Лайк убран', 'likes_count': 0}
+
+    await likes.drain_pending_likes(redis_client, session_factory)
+
+    assert await db_likes(db_session, liked.id) == (0, 0)
+
+
+class Interleaved:
+
+    # Сессия сброса, во время открытия или закрытия которой вклинивается другой сброс
+    def __init__(self, session_factory, before=None, after=None):
+        self.session = session_factory()
+        self.before, self.after = before, after
+
+    async def __aenter__(self):
+
+        if self.before:
+            await self.before()
+
+        return await self.session.__aenter__()
+
+    async def __aexit__(self, *exc):
+
+        result = await self.session.__aexit__(*exc)
+
+        if self.after:
+            await self.after()
+
+        return result
+
+
+async def steal_flush_lock(redis_client):
+    # Аренда истекла, блокировку взял другой сброс
+    await redis_client.set(likes.FLUSH_LOCK_KEY, 'other')
+
+
+@pytest.mark.anyio
+async def test_lease_lost_before_commit_keeps_newer_toggles(write_behind, authenticated_client: AsyncClient, db_session: AsyncSession, test_user: models.User, redis_client, session_factory):
+
+    post = models.Post(title='Пост', content='Текст', owner_id=test_user.id)
+    db_session.add(post)
+    await db_session.commit()
+
+    await authenticated_client.post(f'/post/{post.id}/like')
+
+    async def second_flusher():
+        await steal_flush_lock(redis_client)
+
+        # Лайк снят, и второй сброс уже слил это в *:flushing поверх снимка первого
+        await authenticated_client.post(f'/post/{post.id}/like')
+        await redis_client.eval(likes.DRAIN_SCRIPT, 4, likes.DIRTY_KEY, likes.FLUSHING_KEY, likes.DELTA_KEY, likes.FLUSHING_DELTA_KEY, likes.PREFIX)
+
+    assert await likes.flush_pending_likes(redis_client, lambda: Interleaved(session_factory, before=second_flusher)) == 0
+
+    assert await db_likes(db_session, post.id) == (0, 0)
+    assert await redis_client.hgetall(likes.flushing_state_key(post.id)) == {str(test_user.id).encode(): b'0'}
+
+    await redis_client.delete(likes.FLUSH_LOCK_KEY)
+
+    assert await likes.flush_pending_likes(redis_client, session_factory) == 1
+
+    assert await db_likes(db_session, post.id) == (0, 0)
+    assert not await redis_client.exists(likes.DIRTY_KEY, likes.FLUSHING_KEY, likes.DELTA_KEY, likes.FLUSHING_DELTA_KEY)
+
+
+@pytest.mark.anyio
+async def test_lease_lost_after_commit_overcounts_until_next_flush(write_behind, authenticated_client: AsyncClient, db_session: AsyncSession, test_user: models.User, redis_client, session_factory):
+
+    post = models.Post(title='Пост', content='Текст', owner_id=test_user.id)
+    db_session.add(post)
+    await db_session.commit()
+
+    await authenticated_client.post(f'/post/{post.id}/like')
+
+    assert await likes.flush_pending_likes(redis_client, lambda: Interleaved(session_factory, after=lambda: steal_flush_lock(redis_client))) == 1
+
+    # Очистка пропущена: лайк уже в БД и еще в FLUSHING_DELTA_KEY, завышение не больше разницы этого сброса
+    assert await db_likes(db_session, post.id) == (1, 1)
+    assert (await authenticated_client.get('/posts')).json()[0]['likes_count'] == 2
+
+    await redis_client.delete(likes.FLUSH_LOCK_KEY)
+
+    # Повторный сброс того же снимка ничего не меняет в БД и снимает завышение
+    assert await likes.flush_pending_likes(redis_client, session_factory) == 1
+
+    assert await db_likes(db_session, post.id) == (1, 1)
+    assert (await authenticated_client.get('/posts')).json()[0]['likes_count'] == 1
+    assert not await redis_client.exists(likes.DIRTY_KEY, likes.FLUSHING_KEY, likes.DELTA_KEY, likes.FLUSHING_DELTA_KEY)
+
+
+@pytest.mark.anyio
+async def test_flush_renews_lease(write_behind, authenticated_client: AsyncClient, db_session: AsyncSession, test_user: models.User, redis_client, session_factory, monkeypatch):
+
+    monkeypatch.setattr(likes.settings, 'likes_flush_lock_lease_ms', 150)
+
+    post = models.Post(title='Пост', content='Текст', owner_id=test_user.id)
+    db_session.add(post)
+    await db_session.commit()
+
+    await authenticated_client.post(f'/post/{post.id}/like')
+
+    async def slow_database():
+        # Сброс идет дольше двух сроков аренды
+        await asyncio.sleep(0.4)
+
+        assert await redis_client.exists(likes.FLUSH_LOCK_KEY)
+
+    assert await likes.flush_pending_likes(redis_client, lambda: Interleaved(session_factory, before=slow_database)) == 1
+
+    assert await db_likes(db_session, post.id) == (1, 1)
+    assert not await redis_client.exists(likes.FLUSH_LOCK_KEY, likes.FLUSHING_KEY)
+
+
+@pytest.mark.anyio
+async def test_buffered_like_missing_post(write_behind, authenticated_client: AsyncClient):
+
+    response = await authenticated_client.post('/post/32/like')
+
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'Нет поста'
@@ -1,5 +1,6 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.backend import models
 
@@ -63,6 +64,43 @@ async def test_get_posts(client: AsyncClient, test_user: models.User, db_session
 
 
 
+@pytest.mark.anyio
+async def test_get_posts_cursor(client: AsyncClient, test_user: models.User, db_session: AsyncSession):
+
+    posts = [models.Post(title=f'Пост {i}', content='Текст', owner_id=test_user.id) for i in range(5)]
+
+    db_session.add_all(posts)
+    await db_session.commit()
+
+    response = await client.get('/posts', params={'limit': 2})
+
+    assert response.status_code == 200
+
+    ids = [post['id'] for post in response.json()]
+    cursor = response.headers.get('X-Next-Cursor')
+
+    while cursor:
+        response = await client.get('/posts', params={'limit': 2, 'cursor': cursor})
+
+        assert response.status_code == 200
+
+        ids += [post['id'] for post in response.json()]
+        cursor = response.headers.get('X-Next-Cursor')
+
+    assert ids == sorted([post.id for post in posts], reverse=True)
+
+
+
+@pytest.mark.anyio
+async def test_get_posts_bad_cursor(client: AsyncClient):
+
+    response = await client.get('/posts', params={'cursor': 'not-a-cursor'})
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Некорректный курсор'
+
+
+
 @pytest.mark.anyio
 async def test_put_post(authenticated_client: AsyncClient, test_user: models.User, db_session: AsyncSession):
 
@@ -259,6 +297,39 @@ async def test_like_post(authenticated_client: AsyncClient, db_session: AsyncSes
 
     assert response.status_code == 200
     assert response.json()['detail'] == 'Лайк поставлен'
+    assert response.json()['likes_count'] == 1
+
+
+
+@pytest.mark.anyio
+async def test_unlike_post(authenticated_client: AsyncClient, db_session: AsyncSession, test_user: models.User):
+
+    post = models.Post(title='Новый пост', content='Новый текст', owner_id=test_user.id)
+    
+    db_session.add(post)
+    await db_session.commit()
+
+    await authenticated_client.post(f'/post/{post.id}/like')
+    response = await authenticated_client.post(f'/post/{post.id}/like')
+
+    assert response.status_code == 200
+    assert response.json() == {'detail': 'Лайк убран', 'likes_count': 0}
+
+    likes_count = await db_session.scalar(select(models.Post.likes_count).where(models.Post.id == post.id))
+    assert likes_count == 0
+
+
+
+@pytest.mark.anyio
+async def test_like_missing_post(authenticated_client: AsyncClient, db_session: AsyncSession):
+
+    response = await authenticated_client.post('/post/32/like')
+
+    assert response.status_code == 404
+    assert response.json()['detail'] == 'Нет поста'
+
+    likes = await db_session.execute(select(models.Like))
+    assert likes.scalars().all() == []
 
 
 @pytest.mark.anyio
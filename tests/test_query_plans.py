@@ -0,0 +1,113 @@
+import re
+import pytest
+import redis.asyncio as redis
+from httpx import AsyncClient
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models
+from src.backend.cache import local_caches
+
+USERS = 1000
+POSTS = 3000
+
+# Полный проход по большой таблице: "SCAN posts" без "USING INDEX"
+FULL_SCAN = re.compile(r'^SCAN (posts|likes|users)\b(?! USING)')
+
+# Выгрузка по определению читает таблицу целиком
+FULL_SCAN_ALLOWED = {'GET /posts/export'}
+
+
+async def seed(db_session: AsyncSession, owner: models.User):
+
+    await db_session.execute(insert(models.User.__table__), [
+        {'username': f'user{i}', 'password_hash': 'x'} for i in range(USERS)
+    ])
+    await db_session.execute(insert(models.Post.__table__), [
+        {'title': f'Пост {i}', 'content': f'Текст поста номер {i}', 'owner_id': owner.id if i % 10 == 0 else 2 + i % USERS}
+        for i in range(POSTS)
+    ])
+    await db_session.execute(insert(models.Like.__table__), [
+        {'post_id': 1 + i, 'user_id': 2 + i % USERS} for i in range(POSTS)
+    ])
+
+    # Без статистики планировщик SQLite опирается на эвристики
+    await db_session.execute(text('ANALYZE'))
+    await db_session.commit()
+
+
+@pytest.fixture
+async def captured(session_factory):
+
+    statements = []
+
+    engine = session_factory.kw['bind'].sync_engine
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'WITH'):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+
+    yield statements
+
+    event.remove(engine, 'before_cursor_execute', capture)
+
+
+async def explain(db_session: AsyncSession, statement: str, parameters) -> list[str]:
+
+    connection = await db_session.connection()
+
+    result = await connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', tuple(parameters or ()))
+
+    return [row[-1] for row in result]
+
+
+@pytest.mark.anyio
+async def test_router_queries_avoid_full_scans(authenticated_client: AsyncClient, test_user: models.User, db_session: AsyncSession, redis_client: redis.Redis, captured: list):
+
+    await seed(db_session, test_user)
+
+    first_page = await authenticated_client.get('/posts', params={'limit': 20})
+
+    own_post_id = await db_session.scalar(select(models.Post.id).where(models.Post.owner_id == test_user.id).limit(1))
+
+    routes = [
+        ('GET', '/posts', {'params': {'limit': 20}}),
+        ('GET', '/posts', {'params': {'limit': 20, 'step': 400}}),
+        ('GET', '/posts', {'params': {'limit': 20, 'cursor': first_page.headers['X-Next-Cursor']}}),
+        ('GET', '/posts/search', {'params': {'q': 'номер'}}),
+        ('GET', '/user/posts', {}),
+        ('GET', '/posts/trending', {}),
+        ('GET', '/posts/export', {}),
+        ('GET', '/user/posts/export', {}),
+        ('POST', '/token', {'data': {'username': 'testuser', 'password': 'testpassword'}}),
+        ('POST', f'/post/{own_post_id}/like', {}),
+        ('POST', '/user/2/follow', {}),
+        ('GET', '/feed', {}),
+        ('PUT', f'/post/{own_post_id}', {'json': {'title': 'Новый', 'content': 'Текст'}}),
+        ('DELETE', f'/post/{own_post_id}', {}),
+    ]
+
+    full_scans = []
+
+    for method, url, kwargs in routes:
+        # Кэши сброшены, чтобы каждый маршрут действительно дошел до БД
+        await redis_client.flushdb()
+
+        for local in local_caches.values():
+            local.clear()
+
+        captured.clear()
+
+        response = await authenticated_client.request(method, url, **kwargs)
+
+        assert response.status_code < 400, (method, url, response.text)
+
+        route = f'{method} {url.split("?")[0]}'
+
+        for statement, parameters in list(captured):
+            for detail in await explain(db_session, statement, parameters):
+                if FULL_SCAN.match(detail) and route not in FULL_SCAN_ALLOWED:
+                    full_scans.append((route, detail, statement))
+
+    assert not full_scans
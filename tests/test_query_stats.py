@@ -0,0 +1,97 @@
+import logging
+import pytest
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from sqlalchemy import func, select
+from src.backend import models, query_stats
+
+
+@pytest.mark.anyio
+async def test_endpoint_query_budgets(authenticated_client: AsyncClient, query_budget):
+
+    # Пользователь из токена грузится один раз, дальше берется из локального кэша; плюс выборка подписчиков для fan-out после ответа
+    with query_budget(3):
+        created = await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+
+    with query_budget(2):
+        await authenticated_client.post('/posts', json={'title': 'Второй', 'content': 'Текст'})
+
+    # Страница ленты и владельцы постов одним IN-запросом, без N+1
+    with query_budget(2):
+        await authenticated_client.get('/posts')
+
+    with query_budget(0):
+        await authenticated_client.get('/posts')
+
+    with query_budget(3):
+        await authenticated_client.post(f'/post/{created.json()["id"]}/like')
+
+
+
+@pytest.mark.anyio
+async def test_statement_shapes_ignore_in_list_length():
+
+    assert query_stats.statement_shape('SELECT 1 WHERE id IN (?, ?, ?)') == query_stats.statement_shape('SELECT 1 WHERE id IN (?)')
+    assert query_stats.statement_shape('SELECT 1 WHERE id = $1') == 'SELECT 1 WHERE id = ?'
+
+
+
+@pytest.mark.anyio
+async def test_repeated_statements_are_reported(client: AsyncClient, test_user: models.User, db_session, monkeypatch, caplog):
+
+    db_session.add(models.Post(title='Пост', content='Текст', owner_id=test_user.id))
+    await db_session.commit()
+
+    monkeypatch.setattr(query_stats.settings, 'query_repeat_warning_threshold', 0)
+
+    labels = {'method': 'GET', 'handler': '/posts'}
+
+    before = REGISTRY.get_sample_value('blog_db_repeated_statements_total', labels) or 0.0
+    observed_before = REGISTRY.get_sample_value('blog_db_request_queries_count', labels) or 0.0
+
+    with caplog.at_level(logging.WARNING):
+        await client.get('/posts')
+
+    assert 'N+1' in caplog.text
+    assert REGISTRY.get_sample_value('blog_db_repeated_statements_total', labels) == before + 1
+    assert REGISTRY.get_sample_value('blog_db_request_queries_count', labels) == observed_before + 1
+
+
+
+@pytest.mark.anyio
+async def test_owner_checked_writes_budget(authenticated_client: AsyncClient, query_budget, db_session, test_user: models.User):
+
+    other = models.User(username='other', password_hash='x')
+    db_session.add(other)
+    await db_session.commit()
+
+    foreign = models.Post(title='Чужой', content='Текст', owner_id=other.id)
+    db_session.add(foreign)
+    await db_session.commit()
+
+    created = await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+    post_id = created.json()['id']
+
+    await authenticated_client.post(f'/post/{post_id}/like')
+
+    with query_budget(1):
+        response = await authenticated_client.put(f'/post/{post_id}', json={'title': 'Новый', 'content': 'Текст'})
+
+    assert response.json()['title'] == 'Новый'
+    assert response.json()['likes_count'] == 1
+    assert response.json()['owner']['username'] == test_user.username
+
+    # Промах: второй запрос только чтобы отличить 403 от 404
+    with query_budget(2):
+        assert (await authenticated_client.put(f'/post/{foreign.id}', json={'title': 'x', 'content': 'y'})).status_code == 403
+
+    with query_budget(2):
+        assert (await authenticated_client.put('/post/999', json={'title': 'x', 'content': 'y'})).status_code == 404
+
+    with query_budget(2):
+        assert (await authenticated_client.delete(f'/post/{post_id}')).status_code == 200
+
+    assert await db_session.scalar(select(func.count()).select_from(models.Like)) == 0
+
+    with query_budget(3):
+        assert (await authenticated_client.delete(f'/post/{foreign.id}')).status_code == 403
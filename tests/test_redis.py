@@ -1,7 +1,9 @@
 import pytest
-from unittest.mock import AsyncMock, MagicMock
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, ANY
 from pydantic import TypeAdapter
-from src.backend import schemas, models
+from src.backend import schemas, models, cache
 from src.backend.dependencies import get_posts_by_user_id
 
 
@@ -10,6 +12,8 @@ async def test_redis_cache_hit():
 
     test_redis = AsyncMock()
     test_db = AsyncMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = test_db
 
     fake_data = [
         schemas.Post(
@@ -25,14 +29,15 @@ async def test_redis_cache_hit():
 
     cache_posts_adapter = TypeAdapter(list[schemas.Post])
 
-    test_redis.get.return_value = cache_posts_adapter.dump_json(fake_data)
+    test_redis.get.side_effect = [b'7', cache_posts_adapter.dump_json(fake_data)]
 
-    result = await get_posts_by_user_id(user_id=55, redis_client=test_redis, db=test_db)
+    result = await get_posts_by_user_id(user_id=55, redis_client=test_redis, session_factory=session_factory)
 
-    test_redis.get.assert_awaited_once_with(str(55))
+    test_redis.get.assert_any_await(cache.user_posts_generation_key(55))
+    test_redis.get.assert_awaited_with(cache.user_posts_key(55, 7))
     test_db.execute.assert_not_called()
 
-    assert result == fake_data
+    assert result == cache_posts_adapter.dump_json(fake_data)
 
 
 
@@ -43,6 +48,8 @@ async def test_redis_cache_miss():
 
     test_redis = AsyncMock()
     test_db = AsyncMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = test_db
 
     fake_data = [
         models.Post(
@@ -64,11 +71,117 @@ async def test_redis_cache_miss():
 
     test_db.execute.return_value = mock_scalar
 
-    test_redis.get.return_value = None
+    test_redis.get.side_effect = [b'7', None]
 
-    result = await get_posts_by_user_id(user_id=56, redis_client=test_redis, db=test_db)
+    result = await get_posts_by_user_id(user_id=56, redis_client=test_redis, session_factory=session_factory)
 
-    test_redis.get.assert_awaited_once()
+    test_redis.get.assert_awaited_with(cache.user_posts_key(56, 7))
+    test_redis.set.assert_any_await(cache.user_posts_key(56, 7), ANY, ex=ANY)
+    test_redis.eval.assert_awaited_once()
     test_db.execute.assert_awaited_once()
+    session_factory.return_value.__aexit__.assert_awaited_once()
 
-    assert result == [schemas.Post.model_validate(data) for data in fake_data]
\ No newline at end of file
+    assert TypeAdapter(list[schemas.Post]).validate_json(result) == [schemas.Post.model_validate(data) for data in fake_data]
+
+
+
+@pytest.mark.anyio
+async def test_cache_key_is_versioned():
+
+    key = cache.user_posts_key(1, 3)
+
+    assert key.startswith(f'{cache.NAMESPACE}:v{cache.SCHEMA_VERSION}:')
+    assert key.endswith(':g3')
+    assert cache.user_posts_key(1, 4) != key
+
+
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_are_coalesced(redis_client):
+
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return b'[]'
+
+    results = await asyncio.gather(*[
+        cache.get_or_compute(redis_client, 'coalesce-test', compute, 60, 'test') for _ in range(10)
+    ])
+
+    assert calls == 1
+    assert results == [b'[]'] * 10
+
+
+
+@pytest.mark.anyio
+async def test_coalesced_load_outlives_cancelled_request(redis_client, db_session, test_user, session_factory):
+
+    db_session.add(models.Post(title='Пост', content='Текст', owner_id=test_user.id))
+    await db_session.commit()
+
+    opened = 0
+
+    def counting_factory():
+        nonlocal opened
+        opened += 1
+        return session_factory()
+
+    first = asyncio.create_task(get_posts_by_user_id(test_user.id, redis_client, counting_factory))
+
+    while not cache._inflight:
+        await asyncio.sleep(0)
+
+    second = asyncio.create_task(get_posts_by_user_id(test_user.id, redis_client, counting_factory))
+
+    # Первый запрос отменен, а загрузка, которую ждет второй, идет в своей сессии
+    first.cancel()
+
+    result = await second
+
+    assert first.cancelled()
+    assert opened == 1
+    assert [post.title for post in TypeAdapter(list[schemas.Post]).validate_json(result)] == ['Пост']
+
+
+
+@pytest.mark.anyio
+async def test_miss_waits_for_remote_lock_holder(redis_client):
+
+    await redis_client.set('remote-test:lock', 'other-replica', px=1000)
+
+    async def compute():
+        raise AssertionError('should reuse the value computed by the lock holder')
+
+    async def other_replica():
+        await asyncio.sleep(0.1)
+        await redis_client.set('remote-test', b'[1]')
+
+    result, _ = await asyncio.gather(
+        cache.get_or_compute(redis_client, 'remote-test', compute, 60, 'test'),
+        other_replica()
+    )
+
+    assert result == b'[1]'
+
+
+
+@pytest.mark.anyio
+async def test_early_refresh_recomputes_before_expiry(redis_client, monkeypatch):
+
+    monkeypatch.setattr(cache.settings, 'cache_early_refresh_beta', 1.0)
+
+    async def compute():
+        return b'new'
+
+    await redis_client.set('early-test', b'old', ex=60)
+    # Истекает прямо сейчас, а пересчет стоил минуту: обновление гарантировано
+    await redis_client.set('early-test:meta', f'{int(time.time() * 1000)}:60000', ex=60)
+
+    result = await cache.get_or_compute(redis_client, 'early-test', compute, 60, 'test')
+
+    assert result == b'new'
+    assert await redis_client.get('early-test') == b'new'
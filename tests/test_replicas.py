@@ -0,0 +1,138 @@
+import pytest
+from httpx import AsyncClient
+from src.backend import database, replicas
+
+
+@pytest.fixture
+def replica_sessions(monkeypatch, session_factory):
+
+    opened = []
+
+    def replica(name):
+        def factory():
+            opened.append(name)
+            return session_factory()
+        return factory
+
+    monkeypatch.setattr(database, 'ReplicaSessionLocals', [replica('r0'), replica('r1')])
+    monkeypatch.setattr(replicas, '_down_until', {})
+
+    return opened
+
+
+@pytest.mark.anyio
+async def test_reads_round_robin_and_skip_failed_replica(client: AsyncClient, replica_sessions):
+
+    for _ in range(4):
+        assert (await client.get('/posts/search', params={'q': 'пост'})).status_code == 200
+
+    assert sorted(replica_sessions) == ['r0', 'r0', 'r1', 'r1']
+
+    replicas.mark_down(0)
+    replica_sessions.clear()
+
+    for _ in range(2):
+        await client.get('/posts/search', params={'q': 'пост'})
+
+    assert replica_sessions == ['r1', 'r1']
+
+    replicas.mark_down(1)
+    replica_sessions.clear()
+
+    await client.get('/posts/search', params={'q': 'пост'})
+
+    assert replica_sessions == []
+
+
+
+@pytest.mark.anyio
+async def test_read_your_writes_goes_to_primary(authenticated_client: AsyncClient, test_user, redis_client, replica_sessions):
+
+    await authenticated_client.post('/posts', json={'title': 'Пост', 'content': 'Текст'})
+
+    assert await redis_client.exists(replicas.recent_write_key(test_user.id))
+
+    replica_sessions.clear()
+
+    response = await authenticated_client.get('/posts/search', params={'q': 'пост'})
+
+    assert len(response.json()) == 1
+    assert replica_sessions == []
+
+    # Анонимные чтения в это время идут в реплики
+    del authenticated_client.headers['Authorization']
+
+    await authenticated_client.get('/posts/search', params={'q': 'пост'})
+
+    assert len(replica_sessions) == 1
+
+
+
+@pytest.mark.anyio
+async def test_shared_caches_are_filled_from_primary(authenticated_client: AsyncClient, test_user, db_session, monkeypatch, tmp_path):
+
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from src.backend import models
+
+    # Отстающая реплика: пользователь уже есть, его поста еще нет
+    lagging_engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "replica.db"}')
+
+    async with lagging_engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+        await conn.execute(insert(models.User.__table__).values(id=test_user.id, username=test_user.username, password_hash=test_user.password_hash))
+
+    monkeypatch.setattr(database, 'ReplicaSessionLocals', [sessionmaker(bind=lagging_engine, class_=AsyncSession, expire_on_commit=False)])
+    monkeypatch.setattr(replicas, '_down_until', {})
+
+    db_session.add(models.Post(title='Пост', content='Текст', owner_id=test_user.id))
+    await db_session.commit()
+
+    # Страницы ленты и постов пользователя общие: реплика закрепила бы в них старые данные
+    for url in ('/posts', '/user/posts'):
+        response = await authenticated_client.get(url)
+
+        assert response.status_code == 200
+        assert [post['title'] for post in response.json()] == ['Пост']
+
+    await lagging_engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_cursor_page_from_replica_has_no_etag(client: AsyncClient, test_user, db_session, replica_sessions):
+
+    from src.backend import models
+
+    db_session.add_all([models.Post(title=f'Пост {i}', content='Текст', owner_id=test_user.id) for i in range(3)])
+    await db_session.commit()
+
+    first = await client.get('/posts', params={'limit': 2})
+
+    assert 'ETag' in first.headers
+
+    # Поколение берется из primary, а тело из реплики, которая может отставать
+    second = await client.get('/posts', params={'limit': 2, 'cursor': first.headers['X-Next-Cursor']})
+
+    assert second.status_code == 200
+    assert 'ETag' not in second.headers
+
+
+@pytest.mark.anyio
+async def test_unreachable_replica_falls_back_to_primary(client: AsyncClient, monkeypatch, tmp_path):
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    # Файл в несуществующем каталоге: соединение не открывается
+    unreachable_engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "missing" / "replica.db"}')
+
+    monkeypatch.setattr(database, 'ReplicaSessionLocals', [sessionmaker(bind=unreachable_engine, class_=AsyncSession)])
+    monkeypatch.setattr(replicas, '_down_until', {})
+
+    response = await client.get('/posts/search', params={'q': 'пост'})
+
+    assert response.status_code == 200
+    assert replicas.next_replica() is None
+
+    await unreachable_engine.dispose()
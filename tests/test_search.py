@@ -0,0 +1,76 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models
+
+
+@pytest.mark.anyio
+async def test_search_ranks_title_matches_first(client: AsyncClient, test_user: models.User, db_session: AsyncSession):
+
+    db_session.add_all([
+        models.Post(title='Рецепт дня', content='Как приготовить вареники с картошкой', owner_id=test_user.id),
+        models.Post(title='Вареники', content='Лучшие вареники в городе', owner_id=test_user.id),
+        models.Post(title='Погода', content='Сегодня солнечно', owner_id=test_user.id),
+    ])
+    await db_session.commit()
+
+    response = await client.get('/posts/search', params={'q': 'вареники'})
+
+    assert response.status_code == 200
+    assert [post['title'] for post in response.json()] == ['Вареники', 'Рецепт дня']
+    assert response.json()[0]['owner']['username'] == test_user.username
+
+
+
+@pytest.mark.anyio
+async def test_search_cursor(client: AsyncClient, test_user: models.User, db_session: AsyncSession):
+
+    posts = [models.Post(title=f'Пост {i}', content='одинаковый текст', owner_id=test_user.id) for i in range(5)]
+
+    db_session.add_all(posts)
+    await db_session.commit()
+
+    response = await client.get('/posts/search', params={'q': 'текст', 'limit': 2})
+
+    ids = [post['id'] for post in response.json()]
+    cursor = response.headers.get('X-Next-Cursor')
+
+    while cursor:
+        response = await client.get('/posts/search', params={'q': 'текст', 'limit': 2, 'cursor': cursor})
+
+        ids += [post['id'] for post in response.json()]
+        cursor = response.headers.get('X-Next-Cursor')
+
+    assert sorted(ids) == sorted(post.id for post in posts)
+    assert len(ids) == len(set(ids))
+
+
+
+@pytest.mark.anyio
+async def test_search_follows_updates(authenticated_client: AsyncClient):
+
+    created = await authenticated_client.post('/posts', json={'title': 'Черновик', 'content': 'старый текст'})
+    post_id = created.json()['id']
+
+    await authenticated_client.put(f'/post/{post_id}', json={'title': 'Чистовик', 'content': 'новый текст'})
+
+    response = await authenticated_client.get('/posts/search', params={'q': 'старый'})
+    assert response.json() == []
+
+    response = await authenticated_client.get('/posts/search', params={'q': 'новый'})
+    assert [post['id'] for post in response.json()] == [post_id]
+
+    await authenticated_client.delete(f'/post/{post_id}')
+
+    response = await authenticated_client.get('/posts/search', params={'q': 'новый'})
+    assert response.json() == []
+
+
+
+@pytest.mark.anyio
+async def test_search_ignores_query_syntax(client: AsyncClient):
+
+    response = await client.get('/posts/search', params={'q': '"AND (* -'})
+
+    assert response.status_code == 200
+    assert response.json() == []
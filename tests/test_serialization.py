@@ -0,0 +1,20 @@
+import orjson
+import pytest
+from datetime import datetime
+from src.backend import models, schemas
+from src.backend.serialization import dumps_post_rows, dumps_posts, posts_adapter
+
+
+@pytest.mark.anyio
+async def test_one_pass_rows_match_schema():
+
+    owner = models.User(id=1, username='автор')
+    posts = [
+        models.Post(id=i, title=f'Пост {i}', content='Текст', created_at=datetime(2026, 1, 1, 12, 0, i, 1500), likes_count=i, owner=owner)
+        for i in range(3)
+    ]
+
+    body = dumps_post_rows(posts)
+
+    assert body == dumps_posts([schemas.Post.model_validate(post) for post in posts])
+    assert orjson.loads(body) == posts_adapter.dump_python(posts_adapter.validate_python(posts, from_attributes=True), mode='json')
@@ -0,0 +1,156 @@
+import math
+import pytest
+import redis.asyncio as redis
+from datetime import datetime, timedelta, timezone
+from httpx import AsyncClient
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend import models, trending
+
+NOW = 1_800_000_000.0
+
+
+async def create_posts(client: AsyncClient, count: int) -> list[int]:
+    return [(await client.post('/posts', json={'title': f'Пост {i}', 'content': 'Текст'})).json()['id'] for i in range(count)]
+
+
+@pytest.mark.anyio
+async def test_like_updates_trending(authenticated_client: AsyncClient, redis_client: redis.Redis):
+
+    first, second = await create_posts(authenticated_client, 2)
+
+    await authenticated_client.post(f'/post/{second}/like')
+
+    response = await authenticated_client.get('/posts/trending')
+
+    assert [post['id'] for post in response.json()] == [second]
+    assert response.headers['Cache-Control'] == 'public, max-age=10'
+
+    # Снятый лайк убирает свой вклад, пост без лайков выпадает из рейтинга
+    await authenticated_client.post(f'/post/{second}/like')
+
+    assert await redis_client.zscore(trending.KEY, second) is None
+    assert (await authenticated_client.get('/posts/trending')).json() == []
+
+
+@pytest.mark.anyio
+async def test_scores_decay_without_rescans(redis_client: redis.Redis):
+
+    half_life = trending.settings.trending_half_life_seconds
+
+    for _ in range(3):
+        await trending.record_like(redis_client, 1, 1, 1, now=NOW)
+
+    # Два лайка двумя периодами полураспада позже весят больше трех старых: 2 > 3 / 4
+    for _ in range(2):
+        await trending.record_like(redis_client, 2, 1, 1, now=NOW + 2 * half_life)
+
+    assert await trending.trending_post_ids(redis_client, 10) == [2, 1]
+
+    old, new = await redis_client.zscore(trending.KEY, 1), await redis_client.zscore(trending.KEY, 2)
+
+    assert math.exp(new - old) == pytest.approx(2 / 3 * 4)
+
+    await trending.record_like(redis_client, 2, -1, 1, now=NOW + 2 * half_life)
+
+    assert math.exp(await redis_client.zscore(trending.KEY, 2) - old) == pytest.approx(1 / 3 * 4)
+
+
+@pytest.mark.anyio
+async def test_unlike_does_not_drop_post_with_old_likes(redis_client: redis.Redis):
+
+    half_life = trending.settings.trending_half_life_seconds
+
+    for _ in range(2):
+        await trending.record_like(redis_client, 1, 1, 1, now=NOW)
+
+    await trending.record_like(redis_client, 2, 1, 1, now=NOW)
+
+    # Снятие лайка двумя периодами полураспада позже весит больше обоих старых лайков,
+    # но вычитается не больше половины: остается вклад одного лайка
+    await trending.record_like(redis_client, 1, -1, 1, now=NOW + 2 * half_life)
+
+    assert await redis_client.zscore(trending.KEY, 1) == pytest.approx(await redis_client.zscore(trending.KEY, 2))
+
+    await trending.record_like(redis_client, 1, -1, 0, now=NOW + 2 * half_life)
+
+    assert await trending.trending_post_ids(redis_client, 10) == [2]
+
+
+@pytest.mark.anyio
+async def test_rebuild_merges_with_live_likes(db_session: AsyncSession, test_user: models.User, redis_client: redis.Redis):
+
+    now = datetime(2026, 1, 1)
+
+    db_session.add(models.Post(title='Пост', content='Текст', owner_id=test_user.id, likes_count=1, created_at=now))
+    await db_session.commit()
+
+    # Лайк, записанный другим подом во время перестройки, переживает слияние
+    await trending.record_like(redis_client, 999, 1, 1, now=now.replace(tzinfo=timezone.utc).timestamp())
+
+    assert await trending.rebuild(db_session, redis_client, now=now) == 1
+
+    assert await redis_client.zcard(trending.KEY) == 2
+    assert await redis_client.keys(f'{trending.KEY}:building:*') == []
+
+
+@pytest.mark.anyio
+async def test_trending_pages_and_deleted_posts(authenticated_client: AsyncClient, redis_client: redis.Redis):
+
+    post_ids = await create_posts(authenticated_client, 3)
+
+    for rank, post_id in enumerate(post_ids):
+        for _ in range(rank + 1):
+            await trending.record_like(redis_client, post_id, 1, 1, now=NOW)
+
+    first = await authenticated_client.get('/posts/trending', params={'limit': 2})
+    second = await authenticated_client.get('/posts/trending', params={'limit': 2, 'step': 2})
+
+    assert [post['id'] for post in first.json() + second.json()] == post_ids[::-1]
+
+    await authenticated_client.delete(f'/post/{post_ids[-1]}')
+
+    assert await trending.trending_post_ids(redis_client, 10) == post_ids[1::-1]
+
+
+@pytest.mark.anyio
+async def test_trim_caps_size(redis_client: redis.Redis, monkeypatch):
+
+    monkeypatch.setattr(trending.settings, 'trending_max_size', 3)
+
+    for post_id in range(1, 6):
+        await trending.record_like(redis_client, post_id, 1, 1, now=NOW + post_id)
+
+    assert await trending.trim(redis_client) == 2
+    assert await trending.trending_post_ids(redis_client, 10) == [5, 4, 3]
+
+
+@pytest.mark.anyio
+async def test_rebuild_from_db(db_session: AsyncSession, test_user: models.User, redis_client: redis.Redis, session_factory):
+
+    now = datetime(2026, 1, 1)
+    window = timedelta(seconds=trending.settings.trending_rebuild_window_seconds)
+
+    await db_session.execute(insert(models.Post.__table__), [
+        {'title': 'Старый', 'content': 'Текст', 'owner_id': test_user.id, 'likes_count': 100, 'created_at': now - window - timedelta(hours=1)},
+        {'title': 'Много лайков', 'content': 'Текст', 'owner_id': test_user.id, 'likes_count': 40, 'created_at': now - timedelta(hours=25)},
+        {'title': 'Свежий', 'content': 'Текст', 'owner_id': test_user.id, 'likes_count': 5, 'created_at': now - timedelta(hours=1)},
+        {'title': 'Без лайков', 'content': 'Текст', 'owner_id': test_user.id, 'likes_count': 0, 'created_at': now},
+    ])
+    await db_session.commit()
+
+    ids = {title: post_id for post_id, title in await db_session.execute(select(models.Post.id, models.Post.title))}
+
+    assert await trending.rebuild(db_session, redis_client, now=now) == 2
+
+    # 40 лайков четырьмя периодами полураспада раньше весят 2.5 против 5 свежих
+    assert await trending.trending_post_ids(redis_client, 10) == [ids['Свежий'], ids['Много лайков']]
+
+    assert not await trending.rebuild_if_missing(redis_client, session_factory)
+
+    await redis_client.delete(trending.KEY)
+    await db_session.execute(update(models.Post).values(created_at=datetime.utcnow()))
+    await db_session.commit()
+
+    assert await trending.rebuild_if_missing(redis_client, session_factory)
+    assert await redis_client.zcard(trending.KEY) == 3